@@ -9,6 +9,7 @@ from django.core.exceptions import ObjectDoesNotExist
 
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.views import exception_handler as rest_exception_handler
 
 from threepio import logger, api_logger
 
@@ -28,6 +29,14 @@ from core.ldap import get_uid_number
 from core.models import AtmosphereUser as DjangoUser
 from core.models.identity import Identity as CoreIdentity
 
+from api.permissions import ProviderDegraded
+
+from service.catalog import catalog_driver
+from service.circuit import guard_driver
+from service.exceptions import ProviderUnavailable
+from service.driver import credential_fingerprint, get_driver_pool,\
+    share_auth_token
+
 
 #These functions return ESH related information based on the core repr
 ESH_MAP = {
@@ -78,20 +87,38 @@ def get_esh_provider(core_provider):
         raise
 
 
-def get_esh_driver(core_identity, username=None):
+def get_esh_driver(core_identity, username=None, guarded=True):
+    """
+    Drivers are reused (per thread) until their credentials change.
+    (See service.driver.DriverPool)
+    guarded - False for admin & monitor drivers. Their listings are slow by
+              design, so they keep the libcloud timeout and stay out of the
+              provider's circuit. (See service.circuit)
+    """
     try:
         core_provider = core_identity.provider
         esh_map = get_esh_map(core_provider)
+        provider = get_esh_provider(core_provider)
+        provider_creds = core_identity.provider.get_esh_credentials(provider)
+        identity_creds = core_identity.get_credentials()
+        fingerprint = credential_fingerprint(provider_creds, identity_creds)
+        driver_pool = get_driver_pool()
+        driver = driver_pool.get(core_identity.id, username, fingerprint,
+                                 guarded)
+        if driver:
+            return driver
         if not username:
             user = core_identity.created_by
         else:
             user = DjangoUser.objects.get(username=username)
-        provider = get_esh_provider(core_provider)
-        provider_creds = core_identity.provider.get_esh_credentials(provider)
-        identity_creds = core_identity.get_credentials()
         identity = esh_map['identity'](provider, user=user, **identity_creds)
-        driver = esh_map['driver'](provider, identity, **provider_creds)
-        return driver
+        driver = catalog_driver(share_auth_token(
+            esh_map['driver'](provider, identity, **provider_creds),
+            fingerprint))
+        if guarded:
+            driver = guard_driver(driver, core_provider.id)
+        return driver_pool.put(core_identity.id, username, fingerprint,
+                               guarded, driver)
     except Exception, e:
         logger.exception(e)
         raise
@@ -126,6 +153,20 @@ def failure_response(status, message):
                     status=status)
 
 
+def exception_handler(exc):
+    """
+    REST_FRAMEWORK['EXCEPTION_HANDLER']
+    A provider whose circuit opened while the view was using it gets the
+    same 503 as 'InMaintenance', instead of a 500.
+    """
+    if isinstance(exc, ProviderUnavailable):
+        logger.warn(exc.message)
+        response = rest_exception_handler(ProviderDegraded(exc.provider_id))
+        response['Retry-After'] = int(exc.retry_after.total_seconds())
+        return response
+    return rest_exception_handler(exc)
+
+
 def invalid_creds(provider_id, identity_id):
     logger.warn('Authentication Failed. Provider-id:%s Identity-id:%s'
                 % (provider_id, identity_id))
@@ -16,7 +16,7 @@ class HypervisorList(APIView):
     """
     List all available Hypervisors
     """
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
 
     def get(self, request, provider_id, identity_id):
         """
@@ -44,7 +44,7 @@ class HypervisorDetail(APIView):
     """
     View a single Hypervisor
     """
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
 
     def get(self, request, provider_id, identity_id, hypervisor_id):
         """
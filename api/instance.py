@@ -1,44 +1,54 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+import csv
 from datetime import datetime
+import json
 import time
 
+from dateutil.parser import parse as parse_date
+
 from django.core.paginator import Paginator,\
     PageNotAnInteger, EmptyPage
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 
 from libcloud.common.types import InvalidCredsError
 
 from threepio import logger
 
+from atmosphere import settings
 
 from core.models import AtmosphereUser as User
 from core.models.provider import AccountProvider
-from core.models.instance import convert_esh_instance
+from core.models.instance import convert_esh_instance, convert_esh_instances,\
+    prefetch_instances, set_active_times
 from core.models.instance import Instance as CoreInstance
 from core.models.size import convert_esh_size
-from core.models.volume import convert_esh_volume
 
 from service import task
 from service.deploy import build_script
+from service.driver import snapshot_driver
 from service.instance import redeploy_init, reboot_instance,\
     launch_instance, resize_instance, confirm_resize,\
     start_instance, resume_instance,\
     stop_instance, suspend_instance,\
-    update_instance_metadata
+    update_instance_metadata, mark_instance_snapshot,\
+    get_instance_snapshot_age, get_snapshot_instances, snapshot_is_fresh
 
 from service.quota import check_over_quota
 from service.exceptions import OverAllocationError, OverQuotaError,\
     SizeNotAvailable, HypervisorCapacityError
 
 from api import failure_response, prepare_driver, invalid_creds
-from api.permissions import ApiAuthRequired
+from api.permissions import InMaintenance, ApiAuthRequired
 from api.serializers import InstanceSerializer, PaginatedInstanceSerializer
 from api.serializers import InstanceHistorySerializer,\
     PaginatedInstanceHistorySerializer
-from api.serializers import VolumeSerializer
 
 
 class InstanceList(APIView):
@@ -48,17 +58,34 @@ class InstanceList(APIView):
     attributes of an Instance are:
     Name, Status (building, active, suspended), Size, Machine"""
 
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id):
         """
         Returns a list of all instances
+
+        Instances are served from the last snapshot in the DB unless
+        the snapshot is older than INSTANCE_SNAPSHOT_MAX_AGE
+        or '?refresh=true' is passed.
         """
         user = request.user
         esh_driver = prepare_driver(request, provider_id, identity_id)
         if not esh_driver:
             return invalid_creds(provider_id, identity_id)
 
+        refresh = request.QUERY_PARAMS.get('refresh', '').lower() == 'true'
+        if not refresh and snapshot_is_fresh(identity_id):
+            core_instance_list = get_snapshot_instances(provider_id,
+                                                        identity_id)
+            serialized_data = InstanceSerializer(core_instance_list,
+                                                 context={'user':request.user},
+                                                 many=True).data
+            response = Response(serialized_data)
+            response['Cache-Control'] = 'no-cache'
+            response['X-Snapshot-Age'] = int(
+                get_instance_snapshot_age(identity_id).total_seconds())
+            return response
+
         instance_list_method = esh_driver.list_instances
 
         if AccountProvider.objects.filter(identity__id=identity_id):
@@ -69,12 +96,13 @@ class InstanceList(APIView):
         except InvalidCredsError:
             return invalid_creds(provider_id, identity_id)
 
-        core_instance_list = [convert_esh_instance(esh_driver,
-                                                   inst,
+        core_instance_list = convert_esh_instances(esh_driver,
+                                                   esh_instance_list,
                                                    provider_id,
                                                    identity_id,
                                                    user)
-                              for inst in esh_instance_list]
+        mark_instance_snapshot(identity_id)
+        core_instance_list = prefetch_instances(core_instance_list)
 
         #TODO: Core/Auth checks for shared instances
 
@@ -83,6 +111,7 @@ class InstanceList(APIView):
                                              many=True).data
         response = Response(serialized_data)
         response['Cache-Control'] = 'no-cache'
+        response['X-Snapshot-Age'] = 0
         return response
 
     def post(self, request, provider_id, identity_id, format=None):
@@ -142,11 +171,15 @@ class InstanceList(APIView):
 class InstanceHistory(APIView):
     """List of instance history for specific instance."""
 
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id=None, identity_id=None):
         """
         Authentication required, Retrieve a list of previously launched instances.
+
+        ?page_size=N&cursor=... - Keyset pagination, follow 'next' for more.
+        ?page=N - Numbered pages (Slower for deep pages)
+        ?export=csv|jsonl - Stream the entire history.
         """
         data = request.DATA
         params = request.QUERY_PARAMS.copy()
@@ -157,15 +190,19 @@ class InstanceHistory(APIView):
             return failure_response(status.HTTP_401_UNAUTHORIZED,
                                     'User not found')
         page = params.pop('page', None)
+        cursor = params.pop('cursor', None)
+        page_size = params.pop('page_size', None)
+        export = params.pop('export', None)
         emulate_name = params.pop('username', None)
         try:
             # Support for staff users to emulate a specific user history
             if user.is_staff and emulate_name:
-                emualate_name = emulate_name[0]  # Querystring conversion
+                emulate_name = emulate_name[0]  # Querystring conversion
                 user = User.objects.get(username=emulate_name)
+            page_size = _history_page_size(page_size)
             # List of all instances created by user
             history_instance_list = CoreInstance.objects.filter(
-                created_by=user).order_by("-start_date")
+                created_by=user).order_by("-start_date", "-id")
             #Filter the list based on query strings
             for filter_key, value in params.items():
                 if 'start_date' == filter_key:
@@ -181,15 +218,26 @@ class InstanceHistory(APIView):
                 elif 'alias' == filter_key:
                     history_instance_list = history_instance_list.filter(
                         provider_alias__contains=value)
+            if export:
+                export = export[0]
+                if export not in HISTORY_EXPORT_TYPES:
+                    raise ValueError("Unknown export '%s', expected one of %s"
+                                     % (export, HISTORY_EXPORT_TYPES.keys()))
+            if cursor:
+                history_instance_list = _after_cursor(history_instance_list,
+                                                      cursor[0])
         except Exception as e:
             return failure_response(
                 status.HTTP_400_BAD_REQUEST,
                 'Bad query string caused filter validation errors : %s'
                 % (e,))
+        history_instance_list = prefetch_instances(history_instance_list)
+        if export:
+            return _export_history(history_instance_list, export)
         if page:
-            paginator = Paginator(history_instance_list, 5)
+            paginator = Paginator(history_instance_list, page_size)
             try:
-                history_instance_page = paginator.page(page)
+                history_instance_page = paginator.page(page[0])
             except PageNotAnInteger:
                 # If page is not an integer, deliver first page.
                 history_instance_page = paginator.page(1)
@@ -197,17 +245,133 @@ class InstanceHistory(APIView):
                 # Page is out of range.
                 # deliver last page of results.
                 history_instance_page = paginator.page(paginator.num_pages)
+            history_instance_page.object_list = set_active_times(
+                list(history_instance_page.object_list))
             serialized_data = \
                 PaginatedInstanceHistorySerializer(
                     history_instance_page).data
+        elif cursor or request.QUERY_PARAMS.get('page_size'):
+            history_instance_page, next_cursor = _history_page(
+                history_instance_list, page_size)
+            next_url = None
+            if next_cursor:
+                next_params = request.QUERY_PARAMS.copy()
+                next_params['cursor'] = next_cursor
+                next_url = "%s?%s" % (
+                    request.build_absolute_uri(request.path),
+                    next_params.urlencode())
+            serialized_data = {
+                "next": next_url,
+                "page_size": page_size,
+                "results": InstanceHistorySerializer(history_instance_page,
+                                                     many=True).data,
+            }
         else:
-            serialized_data = InstanceHistorySerializer(history_instance_list,
-                                                        many=True).data
+            serialized_data = InstanceHistorySerializer(
+                set_active_times(list(history_instance_list)),
+                many=True).data
         response = Response(serialized_data)
         response['Cache-Control'] = 'no-cache'
         return response
 
 
+def _history_page_size(page_size):
+    if not page_size:
+        return settings.INSTANCE_HISTORY_PAGE_SIZE
+    return max(1, min(int(page_size[0]),
+                      settings.INSTANCE_HISTORY_MAX_PAGE_SIZE))
+
+
+def _encode_cursor(core_instance):
+    return urlsafe_b64encode("%s|%s" % (core_instance.start_date.isoformat(),
+                                        core_instance.id))
+
+
+def _after_cursor(history_instance_list, cursor):
+    """
+    Keyset pagination on ('-start_date', '-id'),
+    only rows that come after the (start_date, id) in 'cursor' are returned.
+    """
+    start_date, instance_id = urlsafe_b64decode(str(cursor)).split('|')
+    start_date = parse_date(start_date)
+    return history_instance_list.filter(
+        Q(start_date__lt=start_date)
+        | Q(start_date=start_date, id__lt=int(instance_id)))
+
+
+def _history_page(history_instance_list, page_size):
+    """
+    Returns (page, next_cursor)
+    'next_cursor' is None when there is nothing left to page through.
+    """
+    history_instance_page = list(history_instance_list[:page_size + 1])
+    next_cursor = None
+    if len(history_instance_page) > page_size:
+        history_instance_page = history_instance_page[:page_size]
+        next_cursor = _encode_cursor(history_instance_page[-1])
+    return (set_active_times(history_instance_page), next_cursor)
+
+
+class _Echo(object):
+    """
+    File-like object for csv.writer that hands back each line.
+    """
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (list, tuple)):
+        value = ",".join(value)
+    if value is None:
+        return ""
+    return unicode(value).encode('utf-8')
+
+
+def _stream_history(history_instance_list, export):
+    """
+    Yield the history one batch at a time, so years of history never
+    have to fit in memory.
+    """
+    batch_size = settings.INSTANCE_HISTORY_MAX_PAGE_SIZE
+    writer = csv.writer(_Echo())
+    batch_list = history_instance_list
+    header = None
+    while True:
+        history_instance_page, next_cursor = _history_page(batch_list,
+                                                           batch_size)
+        for row in InstanceHistorySerializer(history_instance_page,
+                                             many=True).data:
+            if export == 'jsonl':
+                yield json.dumps(row, cls=JSONEncoder) + "\n"
+                continue
+            if not header:
+                header = row.keys()
+                yield writer.writerow(header)
+            yield writer.writerow([_csv_value(row.get(key))
+                                   for key in header])
+        if not next_cursor:
+            return
+        batch_list = _after_cursor(history_instance_list, next_cursor)
+
+
+#Export type -> Content-Type
+HISTORY_EXPORT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def _export_history(history_instance_list, export):
+    response = StreamingHttpResponse(
+        _stream_history(history_instance_list, export),
+        content_type=HISTORY_EXPORT_TYPES[export])
+    response['Content-Disposition'] = \
+        'attachment; filename="instance_history.%s"' % export
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 class InstanceAction(APIView):
     """
     This endpoint will allow you to run a specific action on an instance.
@@ -225,7 +389,7 @@ class InstanceAction(APIView):
     attributes of an Instance are:
     Name, Status (building, active, suspended), Size, Machine"""
 
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id, instance_id):
         """Authentication Required, List all available instance actions ,including necessary parameters.
@@ -236,10 +400,10 @@ class InstanceAction(APIView):
                      "volume_id":"required",
                      "device":"optional",
                      "mount_location":"optional"},
-                 "description":"Attaches the volume <id> to instance"},
+                 "description":"Attaches the volume <id> to instance, returns a job <id> (See /jobs/<id>)"},
                 {"action":"detach_volume",
                  "action_params":{"volume_id":"required"},
-                 "description":"Detaches the volume <id> to instance"},
+                 "description":"Detaches the volume <id> to instance, returns a job <id> (See /jobs/<id>)"},
                 {"action":"resize",
                  "action_params":{"size":"required"},
                  "description":"Resize instance to size <id>"},
@@ -277,16 +441,15 @@ class InstanceAction(APIView):
         esh_driver = prepare_driver(request, provider_id, identity_id)
         if not esh_driver:
             return invalid_creds(provider_id, identity_id)
-        instance_list_method = esh_driver.list_instances
-        if AccountProvider.objects.filter(identity__id=identity_id):
-            # Instance list method changes when using the OPENSTACK provider
-            instance_list_method = esh_driver.list_all_instances
+        # Instance list method changes when using the OPENSTACK provider
+        list_all = AccountProvider.objects.filter(
+            identity__id=identity_id).exists()
+        #All lookups for this action share a single listing.
+        snapshot_driver(esh_driver, list_all=list_all)
         try:
-            esh_instance_list = instance_list_method()
+            esh_instance = esh_driver.get_instance(instance_id)
         except InvalidCredsError:
             return invalid_creds(provider_id, identity_id)
-
-        esh_instance = esh_driver.get_instance(instance_id)
         if not esh_instance:
             return failure_response(
                 status.HTTP_400_BAD_REQUEST,
@@ -302,27 +465,31 @@ class InstanceAction(APIView):
                     device = action_params.get('device', None)
                     if device == 'null' or device == 'None':
                         device = None
-                    task.attach_volume_task(esh_driver, esh_instance.alias,
-                                            volume_id, device, mount_location)
+                    job_id = task.attach_volume_task(
+                        esh_driver, esh_instance.alias, volume_id, device,
+                        mount_location, username=user.username)
                 elif 'detach_volume' == action:
-                    (result, error_msg) = task.detach_volume_task(
-                        esh_driver,
-                        esh_instance.alias,
-                        volume_id)
-                    if not result and error_msg:
-                        #Return reason for failed detachment
-                        return failure_response(
-                            status.HTTP_400_BAD_REQUEST,
-                            error_msg)
-                #Task complete, convert the volume and return the object
-                esh_volume = esh_driver.get_volume(volume_id)
-                core_volume = convert_esh_volume(esh_volume,
-                                                 provider_id,
-                                                 identity_id,
-                                                 user)
-                result_obj = VolumeSerializer(core_volume,
-                                              context={'user':request.user}
-                                              ).data
+                    job_id = task.detach_volume_task(
+                        esh_driver, esh_instance.alias, volume_id,
+                        username=user.username)
+                else:
+                    return failure_response(
+                        status.HTTP_400_BAD_REQUEST,
+                        'Unable to to perform action %s.' % (action))
+                #The volume is attached/detached by celery,
+                #the client follows the job until it is done.
+                job_url = reverse('public_apis:job-detail', args=(job_id,),
+                                  request=request)
+                api_response = {
+                    'result': 'accepted',
+                    'message': 'The requested action <%s> was started'
+                    % action,
+                    'job': job_id,
+                    'job_url': job_url,
+                }
+                return Response(api_response,
+                                status=status.HTTP_202_ACCEPTED,
+                                headers={'Location': job_url})
             elif 'resize' == action:
                 size_alias = action_params.get('size', '')
                 if type(size_alias) == int:
@@ -398,7 +565,7 @@ class Instance(APIView):
     Name, Status (building, active, suspended), Size, Machine"""
     #renderer_classes = (JSONRenderer, JSONPRenderer)
 
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id, instance_id):
         """
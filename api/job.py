@@ -0,0 +1,32 @@
+"""
+Atmosphere service job rest api.
+
+"""
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from service.job import get_job, job_status
+
+from api import failure_response
+from api.permissions import ApiAuthRequired
+
+
+class Job(APIView):
+    """
+    Progress & result of a job started by another request.
+    (e.g. attach_volume/detach_volume instance actions)
+    """
+    permission_classes = (ApiAuthRequired,)
+
+    def get(self, request, job_id):
+        """
+        Authentication Required, the state of each step of the job.
+        Once the state is 'success', 'result' holds the result of each step.
+        """
+        job = get_job(job_id)
+        if not job or job['username'] != request.user.username:
+            return failure_response(
+                status.HTTP_404_NOT_FOUND,
+                "Job %s does not exist or has expired." % job_id)
+        return Response(job_status(job), status=status.HTTP_200_OK)
@@ -210,7 +210,7 @@ class MachineSearch(APIView):
 class Machine(APIView):
     """Details about a specific machine, as seen by that identity."""
 
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id, machine_id):
         """
@@ -308,7 +308,7 @@ class MachineIcon(APIView):
     TODO: DELETE when we allow owners to 'end-date' their machine..
     """
     renderer_classes = (JPEGRenderer,PNGRenderer,)
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
 
     def get(self, request, provider_id, identity_id, machine_id):
         user = request.user
@@ -23,7 +23,7 @@ class Meta(APIView):
     """
     Meta-details about Atmosphere API, including self-describing URLs.
     """
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
 
     def get(self, request, provider_id, identity_id):
         """
@@ -89,7 +89,7 @@ class MetaAction(APIView):
     """
     Atmosphere service meta rest api.
     """
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id, action=None):
         """
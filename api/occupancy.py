@@ -10,7 +10,7 @@ from rest_framework.response import Response
 
 
 from core.models.provider import Provider
-from core.models.size import convert_esh_size
+from core.models.size import convert_esh_sizes
 
 from service.driver import get_admin_driver
 
@@ -41,8 +41,7 @@ class Occupancy(APIView):
                 "The driver cannot be retrieved for this provider.")
         meta_driver = admin_driver.meta(admin_driver=admin_driver)
         esh_size_list = meta_driver.occupancy()
-        core_size_list = [convert_esh_size(size, provider_id)
-                          for size in esh_size_list]
+        core_size_list = convert_esh_sizes(esh_size_list, provider_id)
         serialized_data = ProviderSizeSerializer(core_size_list,
                                                  many=True).data
         return Response(serialized_data)
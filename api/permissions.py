@@ -1,7 +1,16 @@
 """
 Atmosphere API's extension of DRF permissions.
 """
-from rest_framework import permissions
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException
+
+
+class ProviderDegraded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    def __init__(self, provider_id):
+        self.detail = "Provider %s is degraded. Try again later."\
+            % provider_id
 
 class ApiAuthRequired(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -18,4 +27,10 @@ class ApiAuthOptional(permissions.BasePermission):
 
 class InMaintenance(permissions.BasePermission):
     def has_permission(self, request, view):
+        #Fail fast instead of waiting on a provider with an open circuit
+        #Do not move up. ImportError.
+        from service.circuit import circuit_state, OPEN
+        provider_id = getattr(view, 'kwargs', {}).get('provider_id')
+        if provider_id and circuit_state(provider_id) == OPEN:
+            raise ProviderDegraded(provider_id)
         return True
@@ -86,13 +86,26 @@ class ProjectsField(serializers.WritableField):
         if type(request_user) == AnonymousUser:
             return None
         try:
-            group = get_user_group(request_user.username)
-            projects = project_mgr.filter(owner=group)
+            group = self._get_request_group()
+            #NOTE: .all() is served from prefetch_related('projects')
+            projects = [p for p in project_mgr.all()
+                        if group and p.owner_id == group.id]
             # Modifications to how 'project' should be displayed here:
             return [p.id for p in projects]
         except Project.DoesNotExist:
             return None
 
+    def _get_request_group(self):
+        """
+        Lookup the group of the request user once per serializer,
+        not once per object.
+        """
+        root = self.root
+        if not hasattr(root, '_request_group'):
+            root._request_group = get_user_group(
+                root.request_user.username)
+        return root._request_group
+
     def field_from_native(self, data, files, field_name, into):
         value = data.get(field_name)
         if value is None:
@@ -370,7 +383,8 @@ class InstanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Instance
         exclude = ('id', 'end_date', 'provider_machine', 'provider_alias',
-                   'shell', 'vnc', 'password', 'created_by_identity')
+                   'shell', 'vnc', 'password', 'created_by_identity',
+                   'current_history')
 
 
 class InstanceHistorySerializer(serializers.ModelSerializer):
@@ -398,7 +412,7 @@ class InstanceHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Instance
         exclude = ('id', 'provider_machine', 'provider_alias',
-                   'shell', 'vnc', 'created_by_identity')
+                   'shell', 'vnc', 'created_by_identity', 'current_history')
 
 
 class PaginatedInstanceHistorySerializer(pagination.PaginationSerializer):
@@ -13,12 +13,12 @@ from api.permissions import InMaintenance, ApiAuthRequired
 from api.serializers import ProviderSizeSerializer
 
 
-from core.models.size import convert_esh_size
+from core.models.size import convert_esh_size, convert_esh_sizes
 
 
 class SizeList(APIView):
     """List all active sizes."""
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id):
         """
@@ -32,8 +32,7 @@ class SizeList(APIView):
         if not esh_driver:
             return invalid_creds(provider_id, identity_id)
         esh_size_list = esh_driver.list_sizes()
-        all_size_list = [convert_esh_size(size, provider_id)
-                         for size in esh_size_list]
+        all_size_list = convert_esh_sizes(esh_size_list, provider_id)
         if active:
             all_size_list = [s for s in all_size_list if s.active()]
         serialized_data = ProviderSizeSerializer(all_size_list, many=True).data
@@ -43,7 +42,7 @@ class SizeList(APIView):
 
 class Size(APIView):
     """View a single size"""
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id, size_id):
         """
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.cache import get_cache
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from api.permissions import InMaintenance
+from service import circuit
+from service.exceptions import ProviderUnavailable
+
+
+class _ProviderView(APIView):
+    """
+    A provider-scoped view whose provider stops answering mid-request.
+    """
+    authentication_classes = ()
+    permission_classes = (InMaintenance,)
+    calls = []
+
+    def get(self, request, provider_id):
+        self.calls.append(provider_id)
+        raise ProviderUnavailable(provider_id, timedelta(minutes=1))
+
+
+class ProviderDegradedTests(TestCase):
+    """
+    Degraded providers get a 503, before or while the view runs.
+    """
+
+    def setUp(self):
+        self._cache = circuit.cache
+        circuit.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache',
+            LOCATION='circuit-api-tests')
+        circuit.cache.clear()
+        _ProviderView.calls = []
+        self.view = _ProviderView.as_view()
+        self.request = APIRequestFactory().get('/provider/provider-1/')
+
+    def tearDown(self):
+        circuit.cache = self._cache
+
+    def test_open_circuit_fails_fast(self):
+        circuit.cache.set(circuit._open_key('provider-1'), True, 60)
+        response = self.view(self.request, provider_id='provider-1')
+        self.assertEqual(response.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue('provider-1' in response.data['detail'])
+        self.assertEqual(_ProviderView.calls, [])
+
+    def test_provider_unavailable_is_503(self):
+        response = self.view(self.request, provider_id='provider-1')
+        self.assertEqual(response.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(_ProviderView.calls, ['provider-1'])
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertTrue('provider-1' in response.data['detail'])
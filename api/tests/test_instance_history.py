@@ -0,0 +1,125 @@
+import csv
+from datetime import timedelta
+import json
+from urlparse import urlparse, parse_qs
+
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from atmosphere import settings
+from api.instance import InstanceHistory
+from core.models.instance import clear_cached_statuses
+from core.tests import create_test_identity, create_test_instance
+
+
+class InstanceHistoryTests(TestCase):
+    """
+    Keyset pages and streamed exports of a user's instance history.
+    """
+
+    def setUp(self):
+        clear_cached_statuses()
+        self._max_page_size = settings.INSTANCE_HISTORY_MAX_PAGE_SIZE
+        self.identity = create_test_identity('history')
+        self.user = self.identity.created_by
+        now = timezone.now()
+        #Pairs share a start_date, so the id has to break the tie.
+        self.instances = [
+            create_test_instance(self.identity, 'history-%s' % count,
+                                 start_date=now - timedelta(days=count / 2))
+            for count in range(7)]
+        self.factory = APIRequestFactory()
+        self.view = InstanceHistory.as_view()
+
+    def tearDown(self):
+        settings.INSTANCE_HISTORY_MAX_PAGE_SIZE = self._max_page_size
+        clear_cached_statuses()
+
+    def _get(self, **params):
+        request = self.factory.get('/api/v1/instance_history/', params)
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def _follow(self, response):
+        """
+        Query params of the 'next' link, None on the last page.
+        """
+        if not response.data['next']:
+            return None
+        query = parse_qs(urlparse(response.data['next']).query)
+        return dict((key, value[0]) for key, value in query.items())
+
+    def _expected_aliases(self):
+        ordered = sorted(self.instances,
+                         key=lambda instance: (instance.start_date,
+                                               instance.id),
+                         reverse=True)
+        return [instance.provider_alias for instance in ordered]
+
+    def test_pages_cover_history_once_in_order(self):
+        aliases = []
+        params = {'page_size': 3}
+        while params:
+            response = self._get(**params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(len(response.data['results']) <= 3)
+            aliases.extend(row['alias'] for row in response.data['results'])
+            params = self._follow(response)
+        self.assertEqual(aliases, self._expected_aliases())
+
+    def test_new_instances_do_not_shift_later_pages(self):
+        expected = self._expected_aliases()
+        response = self._get(page_size=3)
+        first_page = [row['alias'] for row in response.data['results']]
+        #Launched while the user is paging, it belongs before page one.
+        create_test_instance(self.identity, 'history-new')
+        response = self._get(**self._follow(response))
+        second_page = [row['alias'] for row in response.data['results']]
+        self.assertEqual(first_page + second_page, expected[:6])
+
+    def test_page_size_is_bounded(self):
+        response = self._get(page_size=0)
+        self.assertEqual(response.data['page_size'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+        settings.INSTANCE_HISTORY_MAX_PAGE_SIZE = 4
+        response = self._get(page_size=10000)
+        self.assertEqual(response.data['page_size'], 4)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_bad_page_size(self):
+        response = self._get(page_size='lots')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bad_cursor(self):
+        response = self._get(cursor='not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_csv(self):
+        #Small batches, the export has to cross several cursors.
+        settings.INSTANCE_HISTORY_MAX_PAGE_SIZE = 2
+        response = self._get(export='csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertTrue('instance_history.csv'
+                        in response['Content-Disposition'])
+        rows = list(csv.reader(''.join(response.streaming_content)
+                               .splitlines()))
+        header = rows[0]
+        self.assertEqual([row[header.index('alias')] for row in rows[1:]],
+                         self._expected_aliases())
+
+    def test_export_jsonl(self):
+        settings.INSTANCE_HISTORY_MAX_PAGE_SIZE = 2
+        response = self._get(export='jsonl')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = ''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['alias'] for line in lines],
+                         self._expected_aliases())
+
+    def test_unknown_export(self):
+        response = self._get(export='xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api import job as job_api
+
+
+class _User(object):
+    def __init__(self, username):
+        self.username = username
+
+    def is_authenticated(self):
+        return True
+
+
+class JobViewTests(TestCase):
+    """
+    A job is only shown to the user who started it.
+    """
+
+    def setUp(self):
+        self._get_job = job_api.get_job
+        self._job_status = job_api.job_status
+        self.jobs = {'job-1': {'id': 'job-1', 'username': 'owner'}}
+        job_api.get_job = self.jobs.get
+        job_api.job_status = lambda job: {'id': job['id'],
+                                          'state': 'pending'}
+        self.factory = APIRequestFactory()
+        self.view = job_api.Job.as_view()
+
+    def tearDown(self):
+        job_api.get_job = self._get_job
+        job_api.job_status = self._job_status
+
+    def _get(self, username, job_id='job-1'):
+        request = self.factory.get('/api/v1/jobs/%s/' % job_id)
+        force_authenticate(request, user=_User(username))
+        return self.view(request, job_id=job_id)
+
+    def test_owner_sees_job(self):
+        response = self._get('owner')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['state'], 'pending')
+
+    def test_other_user_gets_404(self):
+        response = self._get('someone_else')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue('job-1' in response.data['errors'][0]['message'])
+
+    def test_missing_job_gets_404(self):
+        response = self._get('owner', job_id='job-2')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -17,6 +17,7 @@ from api.identity_membership import IdentityMembershipList, IdentityMembership
 from api.identity import IdentityList, Identity, IdentityDetailList
 from api.instance import InstanceList, Instance,\
     InstanceAction, InstanceHistory
+from api.job import Job
 from api.machine import MachineList, Machine, MachineHistory,\
     MachineSearch, MachineVote, MachineIcon
 from api.machine_request import MachineRequestList, MachineRequest,\
@@ -185,6 +186,9 @@ public_apis = format_suffix_patterns(patterns(
     url(r'^instance/$', InstanceHistory.as_view(),
         name='instance-history'),
 
+    url(r'^jobs/(?P<job_id>[a-zA-Z0-9-]+)/$',
+        Job.as_view(), name='job-detail'),
+
     url(identity_specific + r'/instance/'
         + '(?P<instance_id>[a-zA-Z0-9-]+)/action/$',
         InstanceAction.as_view(), name='instance-action'),
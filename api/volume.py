@@ -26,7 +26,7 @@ from api.serializers import VolumeSerializer
 class VolumeList(APIView):
     """List all volumes on Identity"""
 
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
 
     def get(self, request, provider_id, identity_id):
         """
@@ -89,7 +89,7 @@ class VolumeList(APIView):
 
 class Volume(APIView):
     """Details of specific volume on Identity."""
-    permission_classes = (ApiAuthRequired,)
+    permission_classes = (InMaintenance,ApiAuthRequired)
     
     def get(self, request, provider_id, identity_id, volume_id):
         """
@@ -290,7 +290,9 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'authentication.token.OAuthTokenAuthentication',
         'authentication.token.TokenAuthentication',
-    )
+    ),
+    #Open provider circuits --> 503 (See service/circuit.py)
+    'EXCEPTION_HANDLER': 'api.exception_handler',
 }
 #REST_FRAMEWORK_SWAGGER
 SWAGGER_SETTINGS = {
@@ -350,6 +352,57 @@ CELERYD_TASK_LOG_FORMAT="[%(asctime)s: %(name)s-%(levelname)s/%(processName)s [P
 #    )
 CELERY_DEFAULT_QUEUE='default'
 
+##django-redis-cache
+# Shared by web and celery processes
+CACHES = {
+    'default': {
+        'BACKEND': 'redis_cache.RedisCache',
+        'LOCATION': '%s:%s' % (REDIS_HOST, REDIS_PORT),
+        'OPTIONS': {
+            'DB': 1,
+        },
+    },
+}
+
+## ATMOSPHERE INSTANCE SNAPSHOTS
+# InstanceList serves instances from the DB until the last live listing
+# for an identity is older than this. (None == Always list live)
+INSTANCE_SNAPSHOT_MAX_AGE = timedelta(minutes=1)
+# IdentityMembership allocation summaries are refreshed by 'monitor_instances'
+# and dropped on instance state changes. Rebuilt on demand after this long.
+ALLOCATION_SUMMARY_MAX_AGE = timedelta(minutes=30)
+# InstanceHistory page size, '?page_size=' can ask for up to the maximum.
+INSTANCE_HISTORY_PAGE_SIZE = 5
+INSTANCE_HISTORY_MAX_PAGE_SIZE = 500
+# Drivers kept per (WSGI/celery) thread, and how long before they are rebuilt.
+DRIVER_POOL_SIZE = 256
+DRIVER_POOL_TTL = timedelta(minutes=30)
+# Shared keystone tokens are replaced this long before they expire.
+KEYSTONE_TOKEN_MARGIN = timedelta(minutes=5)
+# Identity/Provider credential maps are cached (and versioned) for this long.
+CREDENTIAL_CACHE_TIMEOUT = timedelta(hours=1)
+#Size & image listings are refreshed in the background after CATALOG_TTL,
+#and listed inline once older than CATALOG_MAX_STALE
+CATALOG_TTL = timedelta(minutes=10)
+CATALOG_MAX_STALE = timedelta(hours=1)
+#Providers are queried concurrently, slower providers are reported as failed
+PROVIDER_FANOUT_TIMEOUT = timedelta(minutes=5)
+#Provider circuit breaker: Requests slower than the budget count as failures,
+#after PROVIDER_FAILURE_THRESHOLD failures in a row the provider fails fast
+#until PROVIDER_CIRCUIT_RESET has passed.
+PROVIDER_LATENCY_BUDGET = timedelta(seconds=30)
+PROVIDER_FAILURE_THRESHOLD = 5
+PROVIDER_CIRCUIT_RESET = timedelta(minutes=1)
+#monitor_instances splits each provider into tenant batches of (at least)
+#MONITOR_BATCH_SIZE, growing the batches to stay under MONITOR_MAX_BATCHES.
+MONITOR_BATCH_SIZE = 25
+MONITOR_MAX_BATCHES = 40
+#Instances that tasks are waiting on (See service/watcher.py) are kept in
+#this redis, the chain fails if the instance is not ready in time.
+#(DB 0 is celery's, DB 1 is the cache)
+INSTANCE_WATCH_URL = 'redis://%s:%s/2' % (REDIS_HOST, REDIS_PORT)
+INSTANCE_WATCH_TIMEOUT = timedelta(hours=1)
+
 #NOTE: Leave this block out until the 'bug' regarding CELERY_ROUTES is fixed
 #      See steve gregory for more details..
 
@@ -366,6 +419,12 @@ CELERYBEAT_SCHEDULE = {
         "options": {"expires": 10*60, "time_limit":2*60,
                     "queue": "celery_periodic"}
     },
+    "watch_instances": {
+        "task": "watch_instances",
+        "schedule": timedelta(seconds=15),
+        "options": {"expires": 15, "time_limit": 2*60,
+                    "queue": "celery_periodic"}
+    },
     "monitor_instances": {
         "task": "monitor_instances",
         "schedule" : timedelta(minutes=15),
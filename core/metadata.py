@@ -35,6 +35,9 @@ def update_machine_metadata(esh_driver, esh_machine, data={}):
         logger.info("New metadata:%s" % data)
         meta_response = esh_driver._connection.ex_set_image_metadata(esh_machine, data)
         esh_machine.invalidate_machine_cache(esh_driver.provider, esh_machine)
+        #Don't move it up. Circular reference.
+        from service.catalog import invalidate_catalog
+        invalidate_catalog(esh_driver.provider, 'list_images')
         return meta_response
     except Exception, e:
         logger.exception("Error updating machine metadata")
@@ -18,7 +18,7 @@ from core.models.user import AtmosphereUser
 from core.models.volume import Volume
 from core.models.group import Group, ProviderMembership, IdentityMembership,\
     InstanceMembership
-from core.models.allocation import Allocation
+from core.models.allocation import Allocation, InstanceActiveDay
 from core.models.step import Step
 from core.models.application import Application, ApplicationMembership,\
     ApplicationScore, ApplicationBookmark
@@ -1,8 +1,11 @@
 """
 Service Time Allocation model for atmosphere.
 """
+from datetime import datetime, time, timedelta
 
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 
 class Allocation(models.Model):
@@ -39,3 +42,66 @@ class Allocation(models.Model):
     class Meta:
         db_table = 'allocation'
         app_label = 'core'
+
+
+class InstanceActiveDay(models.Model):
+    """
+    Rollup of the 'active' InstanceStatusHistory time of an instance,
+    one row per (UTC) day. Rows are added to as each history closes,
+    so allocation checks can sum a few rows instead of walking every history.
+    """
+    instance = models.ForeignKey('Instance')
+    identity = models.ForeignKey('Identity', null=True)
+    day = models.DateField()
+    active_seconds = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return "%s on %s: %s seconds active" %\
+            (self.instance_id, self.day, self.active_seconds)
+
+    class Meta:
+        db_table = 'instance_active_day'
+        app_label = 'core'
+        unique_together = ('instance', 'day')
+
+
+def day_start(day):
+    """
+    Returns the (UTC) datetime at the very start of 'day'
+    """
+    return timezone.make_aware(datetime.combine(day, time()), timezone.utc)
+
+
+def split_by_day(start_date, end_date):
+    """
+    Returns a list of (day, seconds) for each UTC day between
+    'start_date' and 'end_date'
+    """
+    split = []
+    current = start_date.astimezone(timezone.utc)
+    end_date = end_date.astimezone(timezone.utc)
+    while current < end_date:
+        next_day = day_start(current.date() + timedelta(days=1))
+        chunk_end = min(next_day, end_date)
+        split.append((current.date(),
+                      int((chunk_end - current).total_seconds())))
+        current = chunk_end
+    return split
+
+
+def record_active_time(history):
+    """
+    Add a closed InstanceStatusHistory to the daily rollup.
+    Histories that are still open, or not active, are ignored.
+    """
+    if not history.end_date or not history.is_active():
+        return
+    instance = history.instance
+    for day, seconds in split_by_day(history.start_date, history.end_date):
+        rollup, created = InstanceActiveDay.objects.get_or_create(
+            instance=instance, day=day,
+            defaults={'identity_id': instance.created_by_identity_id,
+                      'active_seconds': seconds})
+        if not created:
+            InstanceActiveDay.objects.filter(id=rollup.id).update(
+                active_seconds=F('active_seconds') + seconds)
@@ -5,7 +5,9 @@ Note:
   (Identity - identity.py)
 """
 
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from core.models.identity import Identity
 from core.models.provider import Provider
 
@@ -73,3 +75,70 @@ def get_groups_using_credential(cred_key, cred_value, provider):
         affected_membership = affected_identity.identitymembership_set.all()
         all_affected_members.extend(affected_membership)
     return all_affected_members
+
+
+def _version_key(kind, owner_id):
+    return "credential_version:%s:%s" % (kind, owner_id)
+
+
+def get_cached_credentials(kind, owner_id, load_credentials):
+    """
+    Returns the credential map of an identity/provider ('kind'),
+    calling 'load_credentials' on a miss.
+    Maps are stored under a version that is bumped on every change,
+    a map loaded before the bump can never be served after it.
+    """
+    from atmosphere import settings
+    version = cache.get(_version_key(kind, owner_id)) or 0
+    key = "credentials:%s:%s:%s" % (kind, owner_id, version)
+    cred_map = cache.get(key)
+    if cred_map is None:
+        cred_map = load_credentials()
+        cache.set(key, cred_map,
+                  settings.CREDENTIAL_CACHE_TIMEOUT.total_seconds())
+    #Callers are free to modify their copy.
+    return dict(cred_map)
+
+
+def invalidate_credentials(kind, owner_id):
+    version_key = _version_key(kind, owner_id)
+    #NOTE: Outlives the maps it versions (See 'get_cached_credentials')
+    cache.add(version_key, 0, 30*24*60*60)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        #Evicted between add and incr
+        cache.set(version_key, 1, 30*24*60*60)
+
+
+#Save Hooks Here:
+def invalidate_identity_credentials(sender, instance, **kwargs):
+    invalidate_credentials('identity', instance.identity_id)
+
+
+def invalidate_provider_credentials(sender, instance, **kwargs):
+    invalidate_credentials('provider', instance.provider_id)
+
+
+def release_identity_drivers(sender, instance, **kwargs):
+    #Don't move it up. Circular reference.
+    from service.driver import get_driver_pool
+    get_driver_pool().invalidate(instance.identity_id)
+
+
+def release_provider_drivers(sender, instance, **kwargs):
+    #Don't move it up. Circular reference.
+    from service.driver import get_driver_pool
+    get_driver_pool().invalidate()
+
+
+#Instantiate the hooks:
+post_save.connect(invalidate_identity_credentials, sender=Credential)
+post_delete.connect(invalidate_identity_credentials, sender=Credential)
+post_save.connect(invalidate_provider_credentials, sender=ProviderCredential)
+post_delete.connect(invalidate_provider_credentials,
+                    sender=ProviderCredential)
+post_save.connect(release_identity_drivers, sender=Credential)
+post_delete.connect(release_identity_drivers, sender=Credential)
+post_save.connect(release_provider_drivers, sender=ProviderCredential)
+post_delete.connect(release_provider_drivers, sender=ProviderCredential)
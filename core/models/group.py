@@ -4,11 +4,11 @@ to manage users via the membership relationship
 """
 #from datetime import timedelta
 from dateutil.relativedelta import relativedelta
-from math import floor, ceil
 
+from django.core.cache import cache
 from django.db import models
 from django.db.models.signals import post_save
-from django.utils.timezone import datetime, timedelta
+from django.utils.timezone import timedelta
 from django.contrib.auth.models import Group as DjangoGroup
 
 from threepio import logger
@@ -150,31 +150,44 @@ class IdentityMembership(models.Model):
         return None
 
     def get_allocation_dict(self):
+        """
+        Returns the cached allocation summary, building it if necessary.
+        (See 'refresh_allocation_dict')
+        """
+        if not self.allocation:
+            return {}
+        allocation_dict = cache.get(_allocation_key(self.id))
+        if allocation_dict is None:
+            allocation_dict = self.refresh_allocation_dict()
+        return allocation_dict
+
+    def refresh_allocation_dict(self):
+        """
+        Build the allocation summary and store it in the cache.
+        """
+        from atmosphere import settings
+        allocation_dict = self._build_allocation_dict()
+        if allocation_dict:
+            cache.set(_allocation_key(self.id), allocation_dict,
+                      settings.ALLOCATION_SUMMARY_MAX_AGE.total_seconds())
+        return allocation_dict
+
+    def _build_allocation_dict(self):
         if not self.allocation:
             return {}
         #Don't move it up. Circular reference.
         from service.allocation import get_time, get_burn_time,\
-            delta_to_minutes, delta_to_hours, get_delta
+            get_delta, build_allocation_dict
         delta = get_delta(self, time_period=relativedelta(day=1, months=1))
         time_used = get_time(self.identity.created_by,
                              self.identity.id,
                              delta)
         burn_time = get_burn_time(self.identity.created_by, self.identity.id,
                                   delta,
-                                  timedelta(minutes=self.allocation.threshold))
-        mins_consumed = delta_to_minutes(time_used)
-        if burn_time:
-            burn_time = delta_to_hours(burn_time)
-        zero_time = datetime.now() + timedelta(
-                minutes=(self.allocation.threshold - mins_consumed))
-        allocation_dict = {
-            "threshold": floor(self.allocation.threshold/60),
-            "current": floor(mins_consumed/60),
-            "delta": ceil(delta.total_seconds()/60),
-            "burn": burn_time,
-            "ttz": zero_time,
-        }
-        return allocation_dict
+                                  timedelta(minutes=self.allocation.threshold),
+                                  time_used=time_used)
+        return build_allocation_dict(self.allocation, delta,
+                                     time_used, burn_time)
 
     def get_quota_dict(self):
         quota = self.quota
@@ -193,6 +206,8 @@ class IdentityMembership(models.Model):
         specific quota too.
         """
         super(IdentityMembership, self).save(*args, **kwargs)
+        #The allocation may have changed.
+        cache.delete(_allocation_key(self.id))
         try:
             from service.quota import set_provider_quota
             set_provider_quota(self.identity.id)
@@ -208,6 +223,32 @@ class IdentityMembership(models.Model):
         app_label = 'core'
 
 
+def _allocation_key(membership_id):
+    return "allocation_summary:%s" % membership_id
+
+
+def set_allocation_dicts(allocation_dicts):
+    """
+    Cache a map of identity membership id --> allocation summary
+    (See 'service.allocation.get_fleet_allocation_dicts')
+    """
+    from atmosphere import settings
+    cache.set_many(dict((_allocation_key(membership_id), allocation_dict)
+                        for membership_id, allocation_dict
+                        in allocation_dicts.items()),
+                   settings.ALLOCATION_SUMMARY_MAX_AGE.total_seconds())
+
+
+def invalidate_allocation_dict(identity_id):
+    """
+    Drop the cached allocation summaries of every membership of 'identity_id'
+    """
+    membership_ids = IdentityMembership.objects.filter(
+        identity__id=identity_id).values_list('id', flat=True)
+    cache.delete_many([_allocation_key(membership_id)
+                       for membership_id in membership_ids])
+
+
 class InstanceMembership(models.Model):
     """
     InstanceMembership allows group to see Instances in the frontend/API calls.
@@ -225,14 +225,14 @@ class Identity(models.Model):
         return self.created_by.username
 
     def get_credential(self, key):
-        cred = self.credential_set.filter(key=key)
-        return cred[0].value if cred else None
+        return self.get_credentials().get(key)
 
     def get_credentials(self):
-        cred_dict = {}
-        for cred in self.credential_set.all():
-            cred_dict[cred.key] = cred.value
-        return cred_dict
+        #Do not move up. ImportError.
+        from core.models.credential import get_cached_credentials
+        return get_cached_credentials(
+            'identity', self.id,
+            lambda: dict(self.credential_set.values_list('key', 'value')))
 
     def get_allocation(self):
         id_member = self.identitymembership_set.all()[0]
@@ -6,19 +6,21 @@ import time
 from hashlib import md5
 from datetime import datetime, timedelta
 
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Q, Sum
+from django.db.models.signals import post_save, post_delete
+from django.db.models.query import QuerySet, prefetch_related_objects
 #from django.contrib.auth.models import User
 #from core.models import AtmosphereUser as User
 from django.utils import timezone
 
 from rtwo.machine import MockMachine
-from rtwo.size import MockSize
 from threepio import logger
 
+from core.models.allocation import InstanceActiveDay, record_active_time
 from core.models.identity import Identity
 from core.models.machine import ProviderMachine, convert_esh_machine
-from core.models.size import convert_esh_size
+from core.models.size import SizeResolver, resolve_esh_size
 from core.models.tag import Tag
 
 
@@ -33,6 +35,8 @@ class Instance(models.Model):
     and the user who launched the instance are recorded for logging purposes.
     """
     esh = None
+    #Filled out at runtime, see 'set_active_times'
+    rollup_active_time = None
     name = models.CharField(max_length=256)
     #TODO: Create custom Uuidfield?
     #token = Used for looking up the instance on deployment
@@ -49,6 +53,11 @@ class Instance(models.Model):
     password = models.CharField(max_length=64, blank=True, null=True)
     start_date = models.DateTimeField() # Problems when setting a default.
     end_date = models.DateTimeField(null=True)
+    #Denormalized pointer to the newest InstanceStatusHistory.
+    #Maintained by 'update_history', do not set this by hand.
+    current_history = models.ForeignKey('InstanceStatusHistory', null=True,
+                                        blank=True, related_name='+',
+                                        on_delete=models.SET_NULL)
 
     def get_projects(self, user):
         projects = self.projects.filter(
@@ -61,20 +70,31 @@ class Instance(models.Model):
         """
         Returns the newest InstanceStatusHistory
         """
+        if self.current_history_id:
+            return self.current_history
         last_hist = InstanceStatusHistory.objects\
                 .filter(instance=self).order_by('-start_date')
         if not last_hist:
             return None
+        #Instance predates 'current_history', fill in the pointer.
+        self._set_current_history(last_hist[0])
         return last_hist[0]
 
+    def _set_current_history(self, history):
+        """
+        Point 'current_history' at 'history' without re-saving the instance
+        """
+        Instance.objects.filter(id=self.id)\
+                .update(current_history=history)
+        self.current_history = history
+
     def new_history(self, size, status_name, start_date=None):
         """
         Creates a new (Unsaved!) InstanceStatusHistory
         """
         new_hist = InstanceStatusHistory(size=size)
         new_hist.instance = self
-        new_hist.status, created = InstanceStatus.objects\
-                                      .get_or_create(name=status_name)
+        new_hist.status = get_instance_status(status_name)
         if start_date:
             new_hist.start_date=start_date
 #        logger.debug("Created new history object: %s " % (new_hist))
@@ -87,10 +107,18 @@ class Instance(models.Model):
             #Assume instance was Active from start of instance to now
             first_status = 'active'
         first_hist = self.new_history(size, first_status, start_date)
-        first_hist.save()
+        with transaction.atomic():
+            first_hist.save()
+            self._set_current_history(first_hist)
         return first_hist
 
-    def update_history(self, status_name, size, task=None, first_update=False):
+    def update_history(self, status_name, size, task=None, first_update=False,
+                       last_hist=None):
+        """
+        Record 'status_name' (Or the status implied by 'task').
+        'last_hist' can be passed in when the newest InstanceStatusHistory
+        has already been looked up (See 'convert_esh_instances').
+        """
         if task:
             task_to_status = {
                     'resuming':'active',
@@ -113,7 +141,8 @@ class Instance(models.Model):
             #Update to the more relevant task
             if status_2:
                 status_name = status_2
-        last_hist = self.last_history()
+        if not last_hist:
+            last_hist = self.last_history()
         #1. Build an active status if this is the first time
         if not last_hist:
             first_hist = self._build_first_history(status_name, size,
@@ -136,16 +165,29 @@ class Instance(models.Model):
             return (last_hist, None)
         #3. ASSERT: A new history item is required due to a State Change
         now_time = timezone.now()
-        last_hist.end_date = now_time
-        last_hist.save()
         new_hist = self.new_history(size, status_name, now_time)
-        new_hist.save()
+        with transaction.atomic():
+            last_hist.end_date = now_time
+            last_hist.save()
+            record_active_time(last_hist)
+            new_hist.save()
+            self._set_current_history(new_hist)
+        self._invalidate_allocation()
         logger.info("Status Update - User:%s Instance:%s Old:%s New:%s Time:%s"
                     % (self.created_by, self.provider_alias,
                        last_hist.status.name, new_hist.status.name,
                        now_time))
         return (last_hist, new_hist)
 
+    def _invalidate_allocation(self):
+        """
+        Status changed, the allocation summary of the owner is out of date.
+        """
+        #Don't move it up. Circular reference.
+        from core.models.group import invalidate_allocation_dict
+        if self.created_by_identity_id:
+            invalidate_allocation_dict(self.created_by_identity_id)
+
     def get_active_hours(self):
         #Don't move it up. Circular reference.
         from service.allocation import delta_to_hours
@@ -153,6 +195,8 @@ class Instance(models.Model):
         return delta_to_hours(total_time)
 
     def get_active_time(self):
+        if self.rollup_active_time is not None:
+            return self.rollup_active_time
         total_time = self._calculate_active_time()
         return total_time
 
@@ -197,7 +241,10 @@ class Instance(models.Model):
             if not ish.end_date:
 #                logger.info('Saving history:%s' % ish)
                 ish.end_date = now_time
-                ish.save()
+                with transaction.atomic():
+                    ish.save()
+                    record_active_time(ish)
+        self._invalidate_allocation()
         if not self.end_date:
 #            logger.info("Saving Instance:%s" % self)
             self.end_date = now_time
@@ -225,10 +272,18 @@ class Instance(models.Model):
     def esh_status(self):
         if self.esh:
             return self.esh.get_status()
+        #Served from the DB, use the last known status.
+        last_hist = self.last_history()
+        if last_hist:
+            return last_hist.status.name
         return "Unknown"
 
     def esh_size(self):
         if not self.esh or not hasattr(self.esh._node, 'extra'):
+            #Served from the DB, use the last known size.
+            last_hist = self.last_history()
+            if last_hist and last_hist.size:
+                return last_hist.size.alias
             return "Unknown"
         extras = self.esh._node.extra
         if extras.has_key('flavorId'):
@@ -270,6 +325,8 @@ class Instance(models.Model):
     class Meta:
         db_table = "instance"
         app_label = "core"
+        #Keyset pagination of a users history (See api.instance)
+        index_together = [['created_by', 'start_date', 'id']]
 
 
 class InstanceStatus(models.Model):
@@ -277,6 +334,8 @@ class InstanceStatus(models.Model):
     Used to enumerate the types of actions
     (I.e. Stopped, Suspended, Active, Deleted)
     """
+    #Filled out at runtime, see 'get_instance_status'
+    cached_statuses = None
     name = models.CharField(max_length=128)
 
     def __unicode__(self):
@@ -334,6 +393,82 @@ class InstanceStatusHistory(models.Model):
 Useful utility methods for the Core Model..
 """
 
+#Relations followed when an instance is serialized.
+# (See api.serializers.InstanceSerializer & InstanceHistorySerializer)
+INSTANCE_RELATED = ('provider_machine__application',
+                    'provider_machine__provider',
+                    'created_by',
+                    'created_by_identity__created_by',
+                    'created_by_identity__provider',
+                    'current_history__status',
+                    'current_history__size')
+INSTANCE_PREFETCH = ('tags', 'projects')
+
+
+def prefetch_instances(core_instances):
+    """
+    Load everything the instance serializers follow, so serializing
+    N instances costs a constant number of queries.
+    'core_instances' can be a queryset (A new queryset is returned)
+    or a list of instances (Loaded in place and returned).
+    NOTE: For 'active_time' see 'set_active_times'
+    """
+    if isinstance(core_instances, QuerySet):
+        return core_instances.select_related(*INSTANCE_RELATED)\
+                             .prefetch_related(*INSTANCE_PREFETCH)
+    prefetch_related_objects(list(core_instances),
+                             INSTANCE_RELATED + INSTANCE_PREFETCH)
+    return core_instances
+
+
+def set_active_times(core_instances):
+    """
+    Fill in the active time of each instance from the InstanceActiveDay
+    rollup, instead of walking every InstanceStatusHistory. (One query)
+    Expects 'current_history__status' to be loaded (See 'prefetch_instances')
+    """
+    rollups = InstanceActiveDay.objects.filter(
+        instance__in=core_instances).values('instance')\
+        .annotate(total=Sum('active_seconds'))
+    rollup_map = dict((rollup['instance'], rollup['total'])
+                      for rollup in rollups)
+    now = timezone.now()
+    for core_instance in core_instances:
+        last_hist = core_instance.current_history
+        if not last_hist:
+            #Same as '_calculate_active_time', no history to go on.
+            end_date = core_instance.end_date or now
+            core_instance.rollup_active_time = \
+                end_date - core_instance.start_date
+            continue
+        active_time = timedelta(
+            seconds=rollup_map.get(core_instance.id, 0))
+        if not last_hist.end_date and last_hist.is_active():
+            #Still open, not in the rollup yet.
+            active_time += now - last_hist.start_date
+        core_instance.rollup_active_time = active_time
+    return core_instances
+
+
+def get_instance_status(status_name):
+    """
+    Returns the InstanceStatus named 'status_name'.
+    Statuses are cached by name until an InstanceStatus is saved or deleted.
+    """
+    status = (InstanceStatus.cached_statuses or {}).get(status_name)
+    if not status:
+        status, created = InstanceStatus.objects\
+                                        .get_or_create(name=status_name)
+        #Creating the status just cleared the cache
+        if InstanceStatus.cached_statuses is None:
+            InstanceStatus.cached_statuses = {}
+        InstanceStatus.cached_statuses[status_name] = status
+    return status
+
+
+def clear_cached_statuses(sender=None, **kwargs):
+    InstanceStatus.cached_statuses = None
+
 def map_to_identity(core_instances):
     instance_id_map = {}
     for instance in core_instances:
@@ -363,10 +498,16 @@ def _find_esh_ip(esh_instance):
 
 
 def _update_core_instance(core_instance, ip_address, password):
-    core_instance.ip_address = ip_address
-    if password:
+    changed = False
+    if core_instance.ip_address != ip_address:
+        core_instance.ip_address = ip_address
+        changed = True
+    if password and core_instance.password != password:
         core_instance.password = password
-    core_instance.save()
+        changed = True
+    #Only write to the DB when something actually changed
+    if changed:
+        core_instance.save()
 
 def _find_esh_start_date(esh_instance):
     if 'launchdatetime' in esh_instance.extra:
@@ -398,8 +539,10 @@ def _convert_timestamp(create_stamp):
 
 
 def convert_esh_instance(esh_driver, esh_instance, provider_id, identity_id,
-                         user, token=None, password=None):
+                         user, token=None, password=None, size_resolver=None):
     """
+    'size_resolver' can be passed in to share it with the rest of a pass,
+    otherwise only the flavor of 'esh_instance' is looked up.
     """
     instance_id = esh_instance.id
     ip_address = _find_esh_ip(esh_instance)
@@ -429,16 +572,12 @@ def convert_esh_instance(esh_driver, esh_instance, provider_id, identity_id,
     #Confirm instance exists in a project
     _check_project(core_instance, user)
     #Update the InstanceStatusHistory
-    #NOTE: Querying for esh_size because esh_instance
-    #Only holds the alias, not all the values.
-    #As a bonus this is a cached-call
-    esh_size = esh_instance.size
-    if type(esh_size) == MockSize:
-        #MockSize includes only the Alias/ID information
-        #so a lookup on the size is required to get accurate
-        #information.
-        esh_size = esh_driver.get_size(esh_size.id)
-    core_size = convert_esh_size(esh_size, provider_id)
+    #NOTE: esh_instance only holds the size alias (MockSize)
+    if size_resolver:
+        core_size = size_resolver.resolve(esh_instance.size)
+    else:
+        core_size = resolve_esh_size(esh_driver, esh_instance.size,
+                                     provider_id)
     core_instance.update_history(
         esh_instance.extra['status'],
         core_size,
@@ -447,6 +586,143 @@ def convert_esh_instance(esh_driver, esh_instance, provider_id, identity_id,
     core_instance = set_instance_from_metadata(esh_driver, core_instance)
     return core_instance
 
+def convert_esh_instances(esh_driver, esh_instances, provider_id,
+                          identity_id, user, size_resolver=None):
+    """
+    Bulk version of 'convert_esh_instance', used when listing instances.
+    * All existing core instances are found in a single query
+    * Missing core instances are created together
+    * Sizes and machines are converted once per alias
+    * Status history is only written when the status has changed
+    'size_resolver' can be passed in to share it with the rest of a pass.
+
+    Returns a list of core instances, in the same order as 'esh_instances'
+    """
+    if not esh_instances:
+        return []
+    aliases = [esh_instance.id for esh_instance in esh_instances]
+    core_map = _find_instance_map(aliases)
+    #Per-call lookup maps, each machine is converted exactly once.
+    machine_map = {}
+    if not size_resolver:
+        size_resolver = SizeResolver(esh_driver, provider_id)
+    new_instances = []
+    new_aliases = set()
+    for esh_instance in esh_instances:
+        ip_address = _find_esh_ip(esh_instance)
+        core_instance = core_map.get(esh_instance.id)
+        if core_instance:
+            _update_core_instance(core_instance, ip_address, None)
+            continue
+        if esh_instance.id in new_aliases:
+            #Duplicate entries in the listing, create it once.
+            continue
+        new_aliases.add(esh_instance.id)
+        core_machine = _get_cached_machine(esh_driver, esh_instance,
+                                           provider_id, user, machine_map)
+        new_instances.append(Instance(
+            name=esh_instance.name,
+            provider_alias=esh_instance.id,
+            provider_machine=core_machine,
+            ip_address=ip_address,
+            created_by=user,
+            created_by_identity_id=identity_id,
+            shell=False,
+            start_date=_find_esh_start_date(esh_instance)))
+    if new_instances:
+        Instance.objects.bulk_create(new_instances)
+        logger.debug("New instance objects - %s" % list(new_aliases))
+        #NOTE: bulk_create does not set the primary key, so lookup again.
+        core_map.update(_find_instance_map(new_aliases))
+    core_instances = [core_map[alias] for alias in aliases]
+    _check_projects(core_instances, user)
+    history_map = _find_last_history_map(core_instances)
+    for core_instance, esh_instance in zip(core_instances, esh_instances):
+        core_instance.esh = esh_instance
+        core_size = size_resolver.resolve(esh_instance.size)
+        #3rd arg is task OR tmp_status (Set while atmosphere deploys)
+        core_instance.update_history(
+            esh_instance.extra['status'],
+            core_size,
+            esh_instance.extra.get('task') or
+            (esh_instance.extra.get('metadata') or {}).get('tmp_status'),
+            last_hist=history_map.get(core_instance.id))
+    #Update values in core with those found in metadata.
+    return set_instances_from_metadata(esh_driver, core_instances)
+
+
+def _find_instance_map(aliases):
+    """
+    Returns a map of provider_alias --> core instance (One query)
+    """
+    instance_map = {}
+    core_instances = Instance.objects.filter(provider_alias__in=aliases)\
+            .select_related(*INSTANCE_RELATED)
+    for core_instance in core_instances:
+        instance_map[core_instance.provider_alias] = core_instance
+    return instance_map
+
+
+def _find_last_history_map(core_instances):
+    """
+    Returns a map of instance id --> newest (open) InstanceStatusHistory.
+    Only instances without a 'current_history' are looked up.
+    Instances missing from the map will fall back to 'last_history'
+    """
+    history_map = {}
+    missing = [core_instance for core_instance in core_instances
+               if not core_instance.current_history_id]
+    if not missing:
+        return history_map
+    open_history = InstanceStatusHistory.objects.filter(
+        instance__in=missing, end_date=None)\
+        .select_related('status', 'size').order_by('start_date')
+    for history in open_history:
+        #Ordered by start_date, so the newest history wins.
+        history_map[history.instance_id] = history
+    for core_instance in missing:
+        if core_instance.id in history_map:
+            core_instance._set_current_history(
+                history_map[core_instance.id])
+    return history_map
+
+
+def _get_cached_machine(esh_driver, esh_instance, provider_id, user,
+                        machine_map):
+    esh_machine = esh_instance.machine
+    machine_id = esh_machine.id if esh_machine else esh_instance.image_id
+    if machine_id in machine_map:
+        return machine_map[machine_id]
+    if type(esh_machine) == MockMachine:
+        #MockMachine includes only the Alias/ID information
+        #so a lookup on the machine is required to get accurate
+        #information.
+        esh_machine = esh_driver.get_machine(esh_machine.id)
+    core_machine = convert_esh_machine(esh_driver, esh_machine,
+                                       provider_id, user,
+                                       image_id=esh_instance.image_id)
+    machine_map[machine_id] = core_machine
+    return core_machine
+
+
+def _check_projects(core_instances, user):
+    """
+    Bulk version of '_check_project'.
+    Instances without a project are added to the users default project.
+    """
+    in_project = Instance.objects.filter(
+        Q(projects__end_date=None) | Q(projects__end_date__gt=timezone.now()),
+        id__in=[core_instance.id for core_instance in core_instances],
+        projects__owner=user).values_list('id', flat=True)
+    in_project = set(in_project)
+    missing = [core_instance for core_instance in core_instances
+               if core_instance.id not in in_project]
+    if not missing:
+        return
+    default_proj = user.get_default_project()
+    default_proj.instances.add(*missing)
+
+
 def _check_project(core_instance, user):
     """
     Select a/multiple projects the instance belongs to.
@@ -460,25 +736,133 @@ def _check_project(core_instance, user):
     return core_projects
 
 
+def set_instances_from_metadata(esh_driver, core_instances):
+    """
+    Bulk version of 'set_instance_from_metadata'.
+    Metadata is read from the listing payload of each instance
+    and only instances with changes are saved.
+    """
+    #Breakout for drivers (Eucalyptus) that don't support metadata
+    if not hasattr(esh_driver._connection, 'ex_get_metadata'):
+        return core_instances
+    metadata_map = {}
+    for core_instance in core_instances:
+        metadata_map[core_instance.id] = _get_esh_metadata(esh_driver,
+                                                           core_instance)
+    #Only instances that carry tags in their metadata need their tags.
+    tag_map = _find_tag_map([core_instance for core_instance in core_instances
+                             if 'tags' in metadata_map[core_instance.id]])
+    project_map = _find_project_map(
+        [core_instance for core_instance in core_instances
+         if 'projects' in metadata_map[core_instance.id]])
+    return [_apply_metadata(core_instance,
+                            metadata_map[core_instance.id],
+                            tag_map.get(core_instance.id, []),
+                            project_map.get(core_instance.id, []))
+            for core_instance in core_instances]
+
+
 def set_instance_from_metadata(esh_driver, core_instance):
-    #Fixes Dep. loop - Do not remove
-    from api.serializers import InstanceSerializer
     #Breakout for drivers (Eucalyptus) that don't support metadata
     if not hasattr(esh_driver._connection, 'ex_get_metadata'):
         #logger.debug("EshDriver %s does not have function 'ex_get_metadata'"
         #            % esh_driver._connection.__class__)
         return core_instance
+    metadata = _get_esh_metadata(esh_driver, core_instance)
+    tag_names = []
+    if 'tags' in metadata:
+        tag_names = [tag.name for tag in core_instance.tags.all()]
+    project_ids = []
+    if 'projects' in metadata:
+        project_ids = [project.id for project in core_instance.projects.all()]
+    return _apply_metadata(core_instance, metadata, tag_names, project_ids)
+
+
+def _get_esh_metadata(esh_driver, core_instance):
+    """
+    Server metadata is included in the detailed listing (extra['metadata']),
+    only ask the provider when the listing did not include it.
+    """
+    esh_instance = core_instance.esh
+    if esh_instance and 'metadata' in esh_instance.extra:
+        return esh_instance.extra['metadata'] or {}
     esh_instance = esh_driver.get_instance(core_instance.provider_alias)
     if not esh_instance:
+        return {}
+    core_instance.esh = esh_instance
+    return esh_driver._connection.ex_get_metadata(esh_instance)
+
+
+def _find_tag_map(core_instances):
+    """
+    Returns a map of instance id --> [tag names] (One query)
+    """
+    tag_map = {}
+    if not core_instances:
+        return tag_map
+    instance_tags = Instance.tags.through.objects.filter(
+        instance__in=core_instances).values_list('instance_id', 'tag__name')
+    for instance_id, tag_name in instance_tags:
+        tag_map.setdefault(instance_id, []).append(tag_name)
+    return tag_map
+
+
+def _find_project_map(core_instances):
+    """
+    Returns a map of instance id --> [project ids] (One query)
+    """
+    #Don't move it up. Circular reference.
+    from core.models.project import Project
+    project_map = {}
+    if not core_instances:
+        return project_map
+    instance_projects = Project.instances.through.objects.filter(
+        instance__in=core_instances).values_list('instance_id', 'project_id')
+    for instance_id, project_id in instance_projects:
+        project_map.setdefault(instance_id, []).append(project_id)
+    return project_map
+
+
+def _metadata_changes(core_instance, metadata, tag_names, project_ids):
+    """
+    Returns the subset of 'metadata' that would change 'core_instance'
+    """
+    changes = {}
+    if metadata.get('name') and metadata['name'] != core_instance.name:
+        changes['name'] = metadata['name']
+    if 'tags' in metadata:
+        new_tags = metadata['tags']
+        if type(new_tags) != list:
+            new_tags = [new_tags]
+        if set(new_tags) != set(tag_names):
+            changes['tags'] = new_tags
+    if 'projects' in metadata:
+        new_projects = metadata['projects']
+        if type(new_projects) != list:
+            new_projects = [new_projects]
+        #Metadata values are strings, project ids are not.
+        if set(str(project_id) for project_id in new_projects)\
+                != set(str(project_id) for project_id in project_ids):
+            changes['projects'] = metadata['projects']
+    return changes
+
+
+def _apply_metadata(core_instance, metadata, tag_names, project_ids):
+    #Fixes Dep. loop - Do not remove
+    from api.serializers import InstanceSerializer
+    esh_instance = core_instance.esh
+    changes = _metadata_changes(core_instance, metadata, tag_names,
+                                project_ids)
+    if not changes:
+        #Nothing changed, skip the save.
         return core_instance
-    metadata =  esh_driver._connection.ex_get_metadata(esh_instance)
 
     #TODO: Match with actual instance launch metadata in service/instance.py
     #TODO: Probably better to redefine serializer as InstanceMetadataSerializer
     #TODO: Define a creator and their identity by the METADATA instead of
     # assuming its the person who 'found' the instance
 
-    serializer = InstanceSerializer(core_instance, data=metadata,
+    serializer = InstanceSerializer(core_instance, data=changes,
                                     partial=True)
     if not serializer.is_valid():
         logger.warn("Encountered errors serializing metadata:%s"
@@ -514,3 +898,8 @@ def create_instance(provider_id, identity_id, provider_alias, provider_machine,
                      (name, provider_alias,))
     #NOTE: No instance_status_history here, because status is not passed
     return new_inst
+
+
+#Instantiate the hooks:
+post_save.connect(clear_cached_statuses, sender=InstanceStatus)
+post_delete.connect(clear_cached_statuses, sender=InstanceStatus)
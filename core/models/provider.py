@@ -196,10 +196,12 @@ class Provider(models.Model):
         return self.location
 
     def get_credentials(self):
-        cred_map = {}
-        for cred in self.providercredential_set.all():
-            cred_map[cred.key] = cred.value
-        return cred_map
+        #Do not move up. ImportError.
+        from core.models.credential import get_cached_credentials
+        return get_cached_credentials(
+            'provider', self.id,
+            lambda: dict(self.providercredential_set.values_list(
+                'key', 'value')))
 
     def list_admins(self):
         return [admin.identity for admin in self.accountprovider_set.all()]
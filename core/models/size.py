@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
+
+from rtwo.size import MockSize
+
 from core.models.provider import Provider
 
 
@@ -79,33 +82,143 @@ class Size(models.Model):
             self.end_date)
 
 
+class SizeResolver(object):
+    """
+    Resolves the flavors of one provider to core Sizes for a whole pass
+    (e.g. A monitor pass, or an instance listing).
+    The flavor list and the Size rows are loaded once, every lookup
+    after that is a dict lookup.
+    """
+
+    def __init__(self, esh_driver, provider_id):
+        self.esh_driver = esh_driver
+        self.provider_id = provider_id
+        self._size_map = None
+
+    def resolve(self, esh_size):
+        """
+        Returns the core Size of 'esh_size' (An esh size, a MockSize
+        or a flavor id)
+        """
+        if self._size_map is None:
+            self._size_map = self._load()
+        alias = getattr(esh_size, 'id', esh_size)
+        core_size = self._size_map.get(alias)
+        if core_size:
+            return core_size
+        #Not in the flavor list (Deleted, or created since)
+        core_size = resolve_esh_size(self.esh_driver, esh_size,
+                                     self.provider_id)
+        self._size_map[alias] = core_size
+        return core_size
+
+    def _load(self):
+        esh_sizes = self.esh_driver.list_sizes()
+        #Only new or changed flavors are written
+        return dict((core_size.alias, core_size) for core_size in
+                    convert_esh_sizes(esh_sizes, self.provider_id))
+
+
+def resolve_esh_size(esh_driver, esh_size, provider_id):
+    """
+    Returns the core Size of a single 'esh_size' (An esh size, a MockSize
+    or a flavor id), without listing every flavor. (See 'SizeResolver')
+    """
+    if not hasattr(esh_size, '_size') or type(esh_size) == MockSize:
+        #MockSize includes only the Alias/ID information
+        #so a lookup on the size is required to get accurate
+        #information.
+        esh_size = esh_driver.get_size(getattr(esh_size, 'id', esh_size))
+    return convert_esh_size(esh_size, provider_id)
+
+
+def _esh_size_data(esh_size):
+    return {
+        'name': esh_size._size.name,
+        'mem': esh_size._size.ram,
+        'root': esh_size._size.disk,
+        'disk': esh_size.ephemeral,
+        'cpu': esh_size.cpu,
+    }
+
+
+def _size_changes(core_size, esh_size):
+    """
+    Returns the values of 'esh_size' that differ from 'core_size'
+    """
+    return dict((key, value)
+                for key, value in _esh_size_data(esh_size).items()
+                if getattr(core_size, key) != value)
+
+
 def convert_esh_size(esh_size, provider_id):
     """
+    Returns the core Size of 'esh_size'.
+    The row is only written when the flavor is new, or has changed.
     """
     alias = esh_size._size.id
     try:
         core_size = Size.objects.get(alias=alias, provider__id=provider_id)
-        new_esh_data = {
-            'name': esh_size._size.name,
-            'mem': esh_size._size.ram,
-            'root': esh_size._size.disk,
-            'disk': esh_size.ephemeral,
-            'cpu': esh_size.cpu,
-        }
         #Update changed values..
-        core_size.update(**new_esh_data)
+        changes = _size_changes(core_size, esh_size)
+        if changes:
+            core_size.update(**changes)
     except Size.DoesNotExist:
         #Gather up the additional, necessary information to create a DB repr
-        name = esh_size._size.name
-        ram = esh_size._size.ram
-        disk = esh_size._size.disk
-        root = esh_size.ephemeral
-        cpu = esh_size.cpu
-        core_size = create_size(name, alias, cpu, ram, disk, root, provider_id)
+        esh_data = _esh_size_data(esh_size)
+        core_size = create_size(esh_data['name'], alias, esh_data['cpu'],
+                                esh_data['mem'], esh_data['disk'],
+                                esh_data['root'], provider_id)
     core_size.esh = esh_size
     return core_size
 
 
+def convert_esh_sizes(esh_sizes, provider_id):
+    """
+    Bulk version of 'convert_esh_size', used when listing sizes.
+    * All existing sizes are found in a single query
+    * Only new or changed flavors are written, in a single transaction
+
+    Returns a list of core sizes, in the same order as 'esh_sizes'
+    """
+    if not esh_sizes:
+        return []
+    aliases = [esh_size._size.id for esh_size in esh_sizes]
+    core_map = dict((core_size.alias, core_size) for core_size in
+                    Size.objects.filter(provider__id=provider_id,
+                                        alias__in=aliases))
+    new_sizes = {}
+    changed_sizes = {}
+    for esh_size in esh_sizes:
+        alias = esh_size._size.id
+        core_size = core_map.get(alias)
+        if not core_size:
+            new_sizes[alias] = Size(alias=alias, provider_id=provider_id,
+                                    **_esh_size_data(esh_size))
+            continue
+        changes = _size_changes(core_size, esh_size)
+        if changes:
+            changed_sizes[core_size.id] = changes
+            for key, value in changes.items():
+                setattr(core_size, key, value)
+    if new_sizes or changed_sizes:
+        with transaction.atomic():
+            for size_id, changes in changed_sizes.items():
+                Size.objects.filter(id=size_id).update(**changes)
+            Size.objects.bulk_create(new_sizes.values())
+    if new_sizes:
+        #NOTE: bulk_create does not set the primary key, so lookup again.
+        core_map.update((core_size.alias, core_size) for core_size in
+                        Size.objects.filter(provider__id=provider_id,
+                                            alias__in=new_sizes.keys()))
+    core_sizes = []
+    for esh_size in esh_sizes:
+        core_size = core_map[esh_size._size.id]
+        core_size.esh = esh_size
+        core_sizes.append(core_size)
+    return core_sizes
+
+
 def create_size(name, alias, cpu, mem, disk, root, provider_id):
     provider = Provider.objects.get(id=provider_id)
     size = Size.objects.create(
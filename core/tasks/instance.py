@@ -22,29 +22,32 @@ def test_all_instance_links():
 
 
 def get_all_instances():
-    from core.models import Identity, Provider
-    from api import get_esh_driver
-    from service.driver import get_admin_driver
+    from core.models import Provider
+    from service.driver import fan_out
     all_instances = []
-    for provider in Provider.objects.all():
-        if not provider.is_active():
-            #TODO: Optionally we could ensure that anyone using this provider
-            #      Has their times end-dated...
-            #Nothing to add...
+    #TODO: Optionally we could ensure that anyone using an inactive provider
+    #      Has their times end-dated...
+    providers = [p for p in Provider.objects.all() if p.is_active()]
+    for provider, instances, error in fan_out(providers,
+                                              _get_provider_instances):
+        if error:
+            logger.error("Problem accessing all "
+                         "instances for provider: %s (%s)" % (provider, error))
             continue
-        try:
-            admin_driver = get_admin_driver(provider)
-            if not admin_driver:
-                raise Exception("No account admins for provider %s"
-                                % provider)
-            meta_driver = admin_driver.meta(admin_driver=admin_driver)
-            all_instances.extend(meta_driver.all_instances())
-        except:
-            logger.exception("Problem accessing all "
-                             "instances for provider: %s" % provider)
+        all_instances.extend(instances)
     return all_instances
 
 
+def _get_provider_instances(provider):
+    from service.driver import get_admin_driver
+    admin_driver = get_admin_driver(provider)
+    if not admin_driver:
+        raise Exception("No account admins for provider %s"
+                        % provider)
+    meta_driver = admin_driver.meta(admin_driver=admin_driver)
+    return meta_driver.all_instances()
+
+
 def active_instances(instances):
     tested_instances = {}
     for instance in instances:
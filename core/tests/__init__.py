@@ -1,7 +1,9 @@
-from core.tests.instance import *
+from django.utils import timezone
+
 from atmosphere.settings import secrets
 from core.models import PlatformType, ProviderType, ProviderCredential,\
-                        Provider, Identity
+                        Provider, Identity, Group, Application,\
+                        ProviderMachine, Instance
 
 def create_euca_provider():
     provider_type = ProviderType.objects.get_or_create(name='Eucalyptus')[0]
@@ -60,3 +62,28 @@ def create_os_provider():
             cred_ex_project_name=provider['tenant_name'])
         identities.append(identity)
     return identities[0]
+
+def create_test_identity(name):
+    """
+    A user (and group) named 'name', with an identity on a new
+    OpenStack provider.
+    """
+    user, group = Group.create_usergroup(name)
+    provider = Provider.objects.create(
+        location=name, description='',
+        type=ProviderType.objects.get_or_create(name='OpenStack')[0],
+        virtualization=PlatformType.objects.get_or_create(name='KVM')[0])
+    return Identity.objects.create(created_by=user, provider=provider)
+
+def create_test_instance(identity, name, start_date=None):
+    """
+    An instance 'i-<name>' of 'identity', launched from a new machine.
+    """
+    app = Application.objects.create(uuid=name, name=name,
+                                     created_by=identity.created_by)
+    machine = ProviderMachine.objects.create(
+        provider=identity.provider, application=app, identifier=name)
+    return Instance.objects.create(
+        name=name, provider_alias='i-%s' % name, provider_machine=machine,
+        created_by=identity.created_by, created_by_identity=identity,
+        start_date=start_date or timezone.now())
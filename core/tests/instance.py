@@ -1,5 +0,0 @@
-from django.core.urlresolvers import reverse
-from django.test import TestCase
-from django.utils import unittest
-
-from rest_framework import status
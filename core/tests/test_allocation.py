@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import InstanceStatus, InstanceStatusHistory,\
+    InstanceActiveDay
+from core.models.allocation import split_by_day, record_active_time
+from core.tests import create_test_identity, create_test_instance
+
+
+def _utc(*args):
+    return timezone.make_aware(datetime(*args), timezone.utc)
+
+
+class SplitByDayTests(TestCase):
+    """
+    Active time is split on UTC midnight.
+    """
+
+    def test_same_day(self):
+        self.assertEqual(split_by_day(_utc(2014, 3, 1, 10),
+                                      _utc(2014, 3, 1, 12, 30)),
+                         [(date(2014, 3, 1), 2*60*60 + 30*60)])
+
+    def test_crossing_midnight(self):
+        self.assertEqual(split_by_day(_utc(2014, 3, 1, 22),
+                                      _utc(2014, 3, 2, 3)),
+                         [(date(2014, 3, 1), 2*60*60),
+                          (date(2014, 3, 2), 3*60*60)])
+
+    def test_whole_days(self):
+        split = split_by_day(_utc(2014, 2, 27, 12), _utc(2014, 3, 2))
+        self.assertEqual(split, [(date(2014, 2, 27), 12*60*60),
+                                 (date(2014, 2, 28), 24*60*60),
+                                 (date(2014, 3, 1), 24*60*60)])
+
+    def test_local_time(self):
+        #Days are UTC days, whatever the timezone of the dates
+        start = datetime(2014, 3, 1, 16, tzinfo=pytz.FixedOffset(-7*60))
+        self.assertEqual(split_by_day(start, start + timedelta(hours=2)),
+                         [(date(2014, 3, 1), 60*60),
+                          (date(2014, 3, 2), 60*60)])
+
+    def test_empty(self):
+        self.assertEqual(split_by_day(_utc(2014, 3, 1), _utc(2014, 3, 1)),
+                         [])
+
+
+class RecordActiveTimeTests(TestCase):
+    """
+    Closed active histories are added to the daily rollup.
+    """
+
+    def setUp(self):
+        self.identity = create_test_identity('rollup')
+        self.instance = create_test_instance(self.identity, 'rollup',
+                                             start_date=_utc(2014, 3, 1))
+
+    def _record(self, start_date, end_date, status='active'):
+        history = InstanceStatusHistory.objects.create(
+            instance=self.instance, start_date=start_date, end_date=end_date,
+            status=InstanceStatus.objects.get_or_create(name=status)[0])
+        record_active_time(history)
+        return history
+
+    def _rollup(self):
+        return dict(InstanceActiveDay.objects.filter(instance=self.instance)
+                    .values_list('day', 'active_seconds'))
+
+    def test_crossing_midnight(self):
+        self._record(_utc(2014, 3, 1, 22), _utc(2014, 3, 2, 3))
+        self.assertEqual(self._rollup(), {date(2014, 3, 1): 2*60*60,
+                                          date(2014, 3, 2): 3*60*60})
+        self.assertEqual(InstanceActiveDay.objects.filter(
+            identity=self.identity).count(), 2)
+
+    def test_same_day_adds_up(self):
+        self._record(_utc(2014, 3, 1, 1), _utc(2014, 3, 1, 2))
+        self._record(_utc(2014, 3, 1, 5), _utc(2014, 3, 1, 8))
+        self.assertEqual(self._rollup(), {date(2014, 3, 1): 4*60*60})
+
+    def test_open_and_inactive_are_ignored(self):
+        self._record(_utc(2014, 3, 1, 1), None)
+        self._record(_utc(2014, 3, 1, 1), _utc(2014, 3, 1, 5),
+                     status='suspended')
+        self.assertEqual(self._rollup(), {})
@@ -0,0 +1,237 @@
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import unittest
+
+from rest_framework import status
+
+from api.serializers import InstanceSerializer, InstanceHistorySerializer
+from core.models import Instance, InstanceStatus, InstanceStatusHistory,\
+    Size, Tag, Group
+from core.models.instance import prefetch_instances, set_active_times,\
+    get_instance_status, clear_cached_statuses, convert_esh_instances
+from core.tests import create_test_identity, create_test_instance
+
+
+class _Node(object):
+    def __init__(self, ip_address):
+        self.public_ips = [ip_address]
+        self.private_ips = []
+
+
+class _EshInstance(object):
+    """
+    An instance in the listing, launched from the machine 'image_id'.
+    """
+    def __init__(self, alias, image_id, status_name='active', size='1',
+                 ip_address='10.0.0.1'):
+        self.id = alias
+        self.name = alias
+        self.machine = None
+        self.image_id = image_id
+        self.size = size
+        self._node = _Node(ip_address)
+        self.extra = {'status': status_name,
+                      'created': '2014-03-01T00:00:00Z',
+                      'metadata': {}}
+
+
+class _Connection(object):
+    def ex_get_metadata(self, esh_instance):
+        raise AssertionError("Metadata is read from the listing")
+
+
+class _Driver(object):
+    _connection = _Connection()
+
+
+class _SizeResolver(object):
+    def __init__(self, sizes):
+        self.sizes = dict((size.alias, size) for size in sizes)
+
+    def resolve(self, esh_size):
+        return self.sizes[esh_size]
+
+
+class ConvertEshInstancesTests(TestCase):
+    """
+    The instance listing is converted with a fixed number of queries,
+    and history is only written for instances that changed.
+    """
+
+    def setUp(self):
+        #Statuses cached by an earlier test were rolled back with it
+        clear_cached_statuses()
+        self.identity = create_test_identity('convert')
+        self.user = self.identity.created_by
+        self.tiny = Size.objects.create(alias='1', name='tiny',
+                                        provider=self.identity.provider,
+                                        cpu=1, disk=1, root=1, mem=512)
+        self.large = Size.objects.create(alias='2', name='large',
+                                         provider=self.identity.provider,
+                                         cpu=4, disk=1, root=1, mem=8192)
+        self.existing = create_test_instance(self.identity, 'existing')
+        self.existing.update_history('active', self.tiny, first_update=True)
+        #New instances are launched from the machine of 'existing'
+        self.image_id = self.existing.provider_machine.identifier
+
+    def tearDown(self):
+        clear_cached_statuses()
+
+    def _convert(self, esh_instances):
+        return convert_esh_instances(
+            _Driver(), esh_instances, self.identity.provider.id,
+            self.identity.id, self.user,
+            size_resolver=_SizeResolver([self.tiny, self.large]))
+
+    def _esh_instance(self, alias, **kwargs):
+        return _EshInstance(alias, self.image_id, **kwargs)
+
+    def _histories(self, alias):
+        return list(InstanceStatusHistory.objects.filter(
+            instance__provider_alias=alias).order_by('start_date', 'id'))
+
+    def test_new_and_existing_instances(self):
+        core_instances = self._convert([self._esh_instance('i-existing'),
+                                        self._esh_instance('i-new'),
+                                        self._esh_instance('i-new')])
+        self.assertEqual([core_instance.provider_alias
+                          for core_instance in core_instances],
+                         ['i-existing', 'i-new', 'i-new'])
+        self.assertEqual(core_instances[0].id, self.existing.id)
+        #Listed twice, created once
+        new_instance = Instance.objects.get(provider_alias='i-new')
+        self.assertEqual(core_instances[1].id, new_instance.id)
+        self.assertEqual(new_instance.created_by_identity, self.identity)
+        self.assertEqual(new_instance.provider_machine,
+                         self.existing.provider_machine)
+        self.assertEqual(new_instance.start_date.isoformat(),
+                         '2014-03-01T00:00:00+00:00')
+        self.assertTrue(new_instance.projects.filter(
+            owner=self.user, name='Default').exists())
+        histories = self._histories('i-new')
+        self.assertEqual([(history.status.name, history.size)
+                          for history in histories],
+                         [('active', self.tiny)])
+
+    def test_unchanged_instances_keep_their_history(self):
+        self._convert([self._esh_instance('i-existing')])
+        self.assertEqual(len(self._histories('i-existing')), 1)
+
+    def test_changed_status_adds_history(self):
+        self._convert([self._esh_instance('i-existing',
+                                          status_name='suspended')])
+        histories = self._histories('i-existing')
+        self.assertEqual([history.status.name for history in histories],
+                         ['active', 'suspended'])
+        self.assertTrue(histories[0].end_date)
+        self.assertEqual(histories[1].end_date, None)
+
+    def test_changed_size_updates_history(self):
+        self._convert([self._esh_instance('i-existing', size='2')])
+        histories = self._histories('i-existing')
+        self.assertEqual([(history.status.name, history.size)
+                          for history in histories],
+                         [('active', self.large)])
+
+    def _count_queries(self, count):
+        for idx in range(count - Instance.objects.count()):
+            create_test_instance(self.identity, 'listed-%s' % idx)\
+                .update_history('active', self.tiny, first_update=True)
+        esh_instances = [self._esh_instance(core_instance.provider_alias)
+                         for core_instance in Instance.objects.all()]
+        #The first pass finds each 'current_history', like the monitor
+        self._convert(esh_instances)
+        with CaptureQueriesContext(connection) as context:
+            core_instances = self._convert(esh_instances)
+        self.assertEqual(len(core_instances), count)
+        return len(context.captured_queries)
+
+    def test_constant_queries(self):
+        few_queries = self._count_queries(1)
+        many_queries = self._count_queries(10)
+        self.assertEqual(few_queries, many_queries)
+
+
+class InstanceSerializerQueryTests(TestCase):
+    """
+    Serializing N instances must cost a constant number of queries.
+    """
+
+    def setUp(self):
+        #Statuses cached by an earlier test were rolled back with it
+        clear_cached_statuses()
+        self.identity = create_test_identity('query_budget')
+        self.user = self.identity.created_by
+        self.size = Size.objects.create(alias='1', name='tiny',
+                                        provider=self.identity.provider,
+                                        cpu=1, disk=1, root=1, mem=512)
+        self.tag = Tag.objects.create(name='query-budget', description='')
+        self.project = Group.objects.get(name='query_budget')\
+                                    .projects.get(name='Default')
+
+    def tearDown(self):
+        clear_cached_statuses()
+
+    def _add_instances(self, count):
+        for idx in range(count):
+            instance = create_test_instance(
+                self.identity, 'instance-%s' % Instance.objects.count())
+            instance.update_history('active', self.size, first_update=True)
+            instance.tags.add(self.tag)
+            self.project.instances.add(instance)
+
+    def _count_queries(self, serializer_class, history=False):
+        with CaptureQueriesContext(connection) as context:
+            core_instances = prefetch_instances(
+                Instance.objects.filter(created_by=self.user))
+            if history:
+                core_instances = set_active_times(list(core_instances))
+            data = serializer_class(core_instances,
+                                    context={'user': self.user},
+                                    many=True).data
+        return len(data), len(context.captured_queries)
+
+    def _assert_constant(self, serializer_class, history=False):
+        self._add_instances(1)
+        count, few_queries = self._count_queries(serializer_class, history)
+        self.assertEqual(count, 1)
+        self._add_instances(5)
+        count, many_queries = self._count_queries(serializer_class, history)
+        self.assertEqual(count, 6)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_instance_serializer(self):
+        self._assert_constant(InstanceSerializer)
+
+    def test_instance_history_serializer(self):
+        self._assert_constant(InstanceHistorySerializer, history=True)
+
+
+class InstanceStatusCacheTests(TestCase):
+    """
+    Cached statuses are dropped once the status rows change.
+    """
+
+    def setUp(self):
+        clear_cached_statuses()
+
+    def tearDown(self):
+        clear_cached_statuses()
+
+    def test_status_is_cached(self):
+        instance_status = get_instance_status('active')
+        self.assertTrue(get_instance_status('active') is instance_status)
+
+    def test_deleted_status_is_not_reused(self):
+        get_instance_status('active').delete()
+        instance_status = get_instance_status('active')
+        self.assertTrue(InstanceStatus.objects.filter(id=instance_status.id,
+                                                      name='active').exists())
+
+    def test_renamed_status_is_not_reused(self):
+        instance_status = get_instance_status('active')
+        instance_status.name = 'stopped'
+        instance_status.save()
+        self.assertEqual(get_instance_status('active').name, 'active')
@@ -0,0 +1,95 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import PlatformType, ProviderType, Provider, Size
+from core.models.size import convert_esh_sizes, resolve_esh_size
+
+
+class _Flavor(object):
+    def __init__(self, alias, name, ram, disk):
+        self.id = alias
+        self.name = name
+        self.ram = ram
+        self.disk = disk
+
+
+class _EshSize(object):
+    def __init__(self, alias, name='tiny', cpu=1, ram=512, disk=10,
+                 ephemeral=0):
+        self._size = _Flavor(alias, name, ram, disk)
+        self.cpu = cpu
+        self.ephemeral = ephemeral
+
+
+class _Driver(object):
+    """
+    Counts the flavor lookups made through it.
+    """
+    def __init__(self, esh_sizes):
+        self.esh_sizes = esh_sizes
+        self.calls = []
+
+    def list_sizes(self):
+        self.calls.append('list_sizes')
+        return self.esh_sizes
+
+    def get_size(self, alias):
+        self.calls.append('get_size')
+        return [esh_size for esh_size in self.esh_sizes
+                if esh_size._size.id == alias][0]
+
+
+class SizeSyncTests(TestCase):
+    """
+    Listing unchanged flavors must not write to the DB.
+    """
+
+    def setUp(self):
+        self.provider = Provider.objects.create(
+            location='SizeSync', description='',
+            type=ProviderType.objects.get_or_create(name='OpenStack')[0],
+            virtualization=PlatformType.objects.get_or_create(name='KVM')[0])
+
+    def _writes(self, esh_sizes):
+        with CaptureQueriesContext(connection) as context:
+            core_sizes = convert_esh_sizes(esh_sizes, self.provider.id)
+        #Some backends log "QUERY = '...' - PARAMS = ...", match anywhere
+        writes = [query for query in context.captured_queries
+                  if re.search(r'\b(INSERT|UPDATE|DELETE)\b',
+                               query['sql'].upper())]
+        return core_sizes, writes
+
+    def test_new_sizes_are_created(self):
+        core_sizes, writes = self._writes(
+            [_EshSize(str(idx)) for idx in range(30)])
+        self.assertEqual(len(core_sizes), 30)
+        self.assertTrue(all(core_size.id for core_size in core_sizes))
+        self.assertEqual(
+            Size.objects.filter(provider=self.provider).count(), 30)
+
+    def test_unchanged_sizes_are_not_written(self):
+        esh_sizes = [_EshSize(str(idx)) for idx in range(30)]
+        convert_esh_sizes(esh_sizes, self.provider.id)
+        core_sizes, writes = self._writes(esh_sizes)
+        self.assertEqual(len(core_sizes), 30)
+        self.assertEqual(writes, [])
+
+    def test_changed_sizes_are_updated(self):
+        convert_esh_sizes([_EshSize('1'), _EshSize('2')], self.provider.id)
+        core_sizes, writes = self._writes(
+            [_EshSize('1', cpu=4), _EshSize('2')])
+        self.assertEqual(Size.objects.get(provider=self.provider,
+                                          alias='1').cpu, 4)
+        self.assertEqual(Size.objects.get(provider=self.provider,
+                                          alias='2').cpu, 1)
+
+    def test_single_size_is_resolved_without_listing(self):
+        driver = _Driver([_EshSize(str(idx)) for idx in range(30)])
+        core_size = resolve_esh_size(driver, '7', self.provider.id)
+        self.assertEqual(core_size.alias, '7')
+        self.assertEqual(driver.calls, ['get_size'])
+        self.assertEqual(
+            Size.objects.filter(provider=self.provider).count(), 1)
@@ -55,30 +55,37 @@ Atmo.Models.Volume = Atmo.Models.Base.extend({
   
 		var self = this;
 		var action_url = instance.url() + 'action/';
+		var attach_failed = function() {
+			self.set({
+				'status': 'available',
+				'attach_data_instance_id': null
+			});
+			
+			options.error('failed to attach volume');
+		};
 
 		$.ajax({
 			url: action_url, 
 			type : 'POST', 
 			data: param, 
 			success:function(response_text, textStatus, jqXHR) {
-				self.set({
-					'attach_data_attach_time': null,
-					'attach_data_device': response_text.object.attach_data.device, 
-					'attach_data_instance_id': instance.get('id'),
-					'status': 'in-use'
+				// The volume is attached by a job, wait for it to finish
+				self.follow_job(response_text.job_url, {
+					success: function(job) {
+						self.set({
+							'attach_data_attach_time': null,
+							'attach_data_device': job.result.attach,
+							'attach_data_instance_id': instance.get('id'),
+							'status': 'in-use'
+						});
+
+						self.trigger('attach');
+						options.success(job);
+					},
+					error: attach_failed
 				});
-				
-				self.trigger('attach');
-				options.success(response_text);
 			}, 
-			error: function (jqXHR, textStatus, errorThrown) {
-				self.set({
-					'status': 'available',
-					'attach_data_instance_id': null
-				});
-				
-				options.error('failed to attach volume');
-			}
+			error: attach_failed
 		});
 	},
 	detach: function(instance, options) {
@@ -99,24 +106,59 @@ Atmo.Models.Volume = Atmo.Models.Base.extend({
 		this.set({'status': 'detaching'});
 		var self = this;
 		var action_url = instance.url() + 'action/';
+		var detach_failed = function(response_data) {
+			options.error('failed to detach volume', response_data);
+			self.set({'status': 'in-use'});
+		};
 		
 		$.ajax({
 			url: action_url, 
 			type: "POST", 
 			data: param, 
 			success: function(response_data) {
-				self.set({
-					//'attach_data_attach_time': null,
-					//'attach_data_device': null,
-					//'attach_data_instance_id': null,
-					'status': 'detaching'
+				// The volume is detached by a job, wait for it to finish
+				self.follow_job(response_data.job_url, {
+					success: function(job) {
+						self.set({
+							//'attach_data_attach_time': null,
+							//'attach_data_device': null,
+							//'attach_data_instance_id': null,
+							'status': 'detaching'
+						});
+						self.trigger('detach');
+						options.success();
+					},
+					error: detach_failed
 				});
-				self.trigger('detach');
-				options.success();
+			},
+			error: detach_failed
+		});
+	},
+	follow_job: function(job_url, options) {
+		// Poll the job until every step is done. A failed job is passed to
+		// options.error like an error response, so callers can show the
+		// message (e.g. why the volume is busy)
+		var self = this;
+		$.ajax({
+			url: job_url,
+			type: 'GET',
+			success: function(job) {
+				if (job.state == 'success') {
+					options.success(job);
+				} else if (job.state == 'failure') {
+					options.error({
+						'responseText': JSON.stringify({
+							'errors': [{'code': 500, 'message': job.error}]
+						})
+					});
+				} else {
+					setTimeout(function() {
+						self.follow_job(job_url, options);
+					}, 5000);
+				}
 			},
 			error: function(response_data) {
-				options.error('failed to detach volume', response_data);
-				self.set({'status': 'in-use'});
+				options.error(response_data);
 			}
 		});
 	},
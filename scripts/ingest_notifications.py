@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Apply compute (nova) notifications of a provider to the core DB,
+as they happen. See service/notifications.py
+"""
+import argparse
+import json
+
+from core.models import Provider
+
+from service.notifications import consume_notifications,\
+    publish_notification
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Consume compute notifications for a provider.")
+    parser.add_argument("-p",
+                        "--provider",
+                        required=True,
+                        type=int,
+                        help="Database id for a provider.")
+    parser.add_argument("--url",
+                        required=True,
+                        help="Notification broker (amqp:// or redis://)")
+    parser.add_argument("--exchange",
+                        default="nova",
+                        help="Notification exchange (Default: nova)")
+    parser.add_argument("--topic",
+                        default="notifications.info",
+                        help="Notification topic"
+                        + " (Default: notifications.info)")
+    parser.add_argument("--publish",
+                        nargs=2,
+                        metavar=("EVENT_TYPE", "PAYLOAD_JSON"),
+                        help="Publish one notification instead"
+                        + " (For testing a consumer)")
+    args = parser.parse_args()
+    if args.publish:
+        event_type, payload = args.publish
+        publish_notification(args.url, event_type, json.loads(payload),
+                             exchange=args.exchange, routing_key=args.topic)
+        print "Published %s" % event_type
+        return
+    provider = Provider.objects.get(id=args.provider)
+    print "Consuming notifications for %s from %s." % (provider, args.url)
+    consume_notifications(provider, args.url, exchange=args.exchange,
+                          routing_key=args.topic)
+
+
+if __name__ == "__main__":
+    main()
@@ -85,7 +85,7 @@ class AccountDriver():
         self.provider_creds = provider_creds
         admin_identity = provider.get_admin_identity()
         admin_creds = admin_identity.get_credentials()
-        self.admin_driver = get_esh_driver(admin_identity)
+        self.admin_driver = get_esh_driver(admin_identity, guarded=False)
         admin_creds = self._libcloud_to_openstack(admin_creds)
         all_creds = {}
         all_creds.update(admin_creds)
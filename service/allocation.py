@@ -1,10 +1,14 @@
 from datetime import timedelta
+from math import floor, ceil
 
+from django.db.models import F, Q, Sum
 from django.utils import timezone
+from django.utils.timezone import datetime
 from core.models import AtmosphereUser as User
 
 from core.models import IdentityMembership, Identity
-from core.models.instance import Instance
+from core.models.allocation import InstanceActiveDay, day_start
+from core.models.instance import Instance, InstanceStatusHistory
 from threepio import logger
 
 
@@ -20,33 +24,48 @@ def filter_by_time_delta(instances, delta):
     return older_insts
 
 
-def get_burn_time(user, identity_id, delta, threshold):
+def get_burn_time(user, identity_id, delta, threshold, time_used=None):
     """
     INPUT: Total time allowed, total time used (so far),
     The CPU cores multiplier
+    Active cores are counted from the DB, the provider is not contacted.
     """
-    #DONT MOVE -- Circ.Dep.
-    from service.instance import get_core_instances
     if type(user) is not User:
         user = User.objects.filter(username=user)
     if type(delta) is not timedelta:
         delta = timedelta(minutes=delta)
     if type(threshold) is not timedelta:
-        delta = timedelta(minutes=threshold)
-    time_used = get_time(user, identity_id, delta)
-    time_remaining = threshold - time_used
+        threshold = timedelta(minutes=threshold)
+    if time_used is None:
+        time_used = get_time(user, identity_id, delta)
+    cpu_cores = Instance.objects.filter(
+        created_by=user, created_by_identity__id=identity_id,
+        end_date=None, current_history__status__name='active')\
+        .aggregate(cpu=Sum('current_history__size__cpu'))['cpu']
+    return _burn_time(threshold - time_used, cpu_cores)
+
+
+def get_active_cores(identity_ids):
+    """
+    Returns a map of identity id --> CPU cores in use by active instances
+    Uses the size recorded on each instance's current history. (One query)
+    """
+    active_cores = Instance.objects.filter(
+        created_by_identity__id__in=identity_ids,
+        created_by=F('created_by_identity__created_by'),
+        end_date=None, current_history__status__name='active')\
+        .values('created_by_identity')\
+        .annotate(cpu=Sum('current_history__size__cpu'))
+    return dict((cores['created_by_identity'], cores['cpu'])
+                for cores in active_cores)
+
+
+def _burn_time(time_remaining, cpu_cores):
     #If we used all of our allocation, dont calculate burn time
     if time_remaining < timedelta(0):
         return None
-    instances = get_core_instances(identity_id)
-    #If we have no instances, burn-time does not apply
-    if not instances:
-        return None
-    cpu_cores = sum([inst.esh.size.cpu for inst in instances
-                     if inst.last_history()
-                     and inst.last_history().is_active()])
     #If we have no active cores, burn-time does not apply
-    if cpu_cores == 0:
+    if not cpu_cores:
         return None
     #Calculate burn time by dividing remaining time over running cores
     burn_time = time_remaining/cpu_cores
@@ -54,28 +73,29 @@ def get_burn_time(user, identity_id, delta, threshold):
 
 
 def get_time(user, identity_id, delta):
+    """
+    Returns the active time used by 'identity_id' between 'delta' ago and now.
+    Whole days come from the InstanceActiveDay rollup, the partial first day
+    and any histories that are still open are read from the history itself.
+    """
     if type(user) is not User:
         user = User.objects.filter(username=user)
     if type(delta) is not timedelta:
         delta = timedelta(minutes=delta)
-
-    total_time = timedelta(0)
+    now, window_start, first_day, first_day_start = _time_window(delta)
     #Calculate only the specific users time allocation..
-    instances = Instance.objects.filter(created_by=user,
-                                        created_by_identity__id=identity_id)
-    instances = filter_by_time_delta(instances, delta)
-    logger.debug('Calculating time of %s instances' % len(instances))
-    for idx, i in enumerate(instances):
-        #Runtime cannot be larger than the total 'window' of time observed
-        run_time = min(i.get_active_time(), delta)
-        new_total = run_time + total_time
-        logger.debug(
-                '%s:<Instance %s> %s + %s = %s'
-                % (idx, i.provider_alias[-5:],
-                   delta_to_minutes(run_time),
-                   delta_to_minutes(total_time),
-                   delta_to_minutes(new_total)))
-        total_time = new_total
+    rollup_seconds = InstanceActiveDay.objects.filter(
+        instance__created_by=user, identity__id=identity_id,
+        day__gte=first_day).aggregate(
+            total=Sum('active_seconds'))['total'] or 0
+    total_time = timedelta(seconds=rollup_seconds)
+    edge_history = _edge_history(window_start, first_day_start).filter(
+        instance__created_by=user,
+        instance__created_by_identity__id=identity_id)\
+        .values_list('start_date', 'end_date')
+    for start_date, end_date in edge_history:
+        total_time += _edge_time(start_date, end_date,
+                                 now, window_start, first_day_start)
     logger.debug("%s hours == %s minutes == %s"
             % (delta_to_hours(total_time),
                delta_to_minutes(total_time),
@@ -83,6 +103,72 @@ def get_time(user, identity_id, delta):
     return total_time
 
 
+def get_fleet_time(provider, delta, identity_ids=None):
+    """
+    Returns a map of identity id --> active time used between 'delta' ago
+    and now, for every identity on 'provider' (Or just 'identity_ids').
+    Two queries, no matter how many identities or instances are involved.
+    """
+    now, window_start, first_day, first_day_start = _time_window(delta)
+    fleet_time = {}
+    rollups = InstanceActiveDay.objects.filter(
+        identity__provider=provider, day__gte=first_day,
+        instance__created_by=F('identity__created_by'))
+    edge_history = _edge_history(window_start, first_day_start).filter(
+        instance__created_by_identity__provider=provider,
+        instance__created_by=F('instance__created_by_identity__created_by'))
+    if identity_ids is not None:
+        rollups = rollups.filter(identity__id__in=identity_ids)
+        edge_history = edge_history.filter(
+            instance__created_by_identity__id__in=identity_ids)
+    rollups = rollups.values('identity').annotate(total=Sum('active_seconds'))
+    for rollup in rollups:
+        fleet_time[rollup['identity']] = timedelta(seconds=rollup['total'])
+    edge_history = edge_history.values_list(
+        'instance__created_by_identity', 'start_date', 'end_date')
+    for identity_id, start_date, end_date in edge_history:
+        fleet_time[identity_id] = fleet_time.get(identity_id, timedelta(0))\
+            + _edge_time(start_date, end_date,
+                         now, window_start, first_day_start)
+    return fleet_time
+
+
+def _time_window(delta):
+    """
+    Returns (now, window_start, first_day, first_day_start)
+    'first_day' is the first whole (UTC) day inside the window.
+    """
+    now = timezone.now()
+    window_start = now - delta
+    first_day = window_start.astimezone(timezone.utc).date() \
+        + timedelta(days=1)
+    return (now, window_start, first_day, day_start(first_day))
+
+
+def _edge_history(window_start, first_day_start):
+    """
+    Active histories NOT (fully) counted by the rollup:
+    Those still open, and those closed on the partial first day.
+    """
+    return InstanceStatusHistory.objects.filter(
+        Q(end_date=None)
+        | Q(start_date__lt=first_day_start, end_date__gt=window_start),
+        status__name='active')
+
+
+def _edge_time(start_date, end_date, now, window_start, first_day_start):
+    if end_date:
+        #Closed on the partial first day, the rollup covers the rest.
+        end_date = min(end_date, first_day_start)
+    else:
+        #Still open, the rollup has none of it.
+        end_date = now
+    start_date = max(start_date, window_start)
+    if end_date > start_date:
+        return end_date - start_date
+    return timedelta(0)
+
+
 def delta_to_minutes(tdelta):
     total_seconds = tdelta.days*86400 + tdelta.seconds
     total_mins = total_seconds / 60
@@ -149,3 +235,91 @@ def check_over_allocation(username, identity_id,
                      (username, time_diff))
         return (True, time_diff)
     return (False, time_diff)
+
+
+def check_fleet_allocation(provider, time_period=None, identity_ids=None):
+    """
+    Check every identity on 'provider' (Or just 'identity_ids')
+    for over allocation at once. (See 'check_over_allocation')
+
+    Returns a map of identity id --> (over_allocated, time_diff)
+    Identities without an allocation are not included.
+    """
+    verdicts = {}
+    for membership, delta_time, time_used in _fleet_usage(provider,
+                                                          time_period,
+                                                          identity_ids):
+        max_time_allowed = timedelta(minutes=membership.allocation.threshold)
+        time_diff = max_time_allowed - time_used
+        verdicts[membership.identity_id] = (time_diff.total_seconds() <= 0,
+                                            time_diff)
+    logger.debug("%s of %s identities on %s are OVER their allocation"
+                 % (len([v for v in verdicts.values() if v[0]]),
+                    len(verdicts), provider))
+    return verdicts
+
+
+def get_fleet_allocation_dicts(provider, time_period=None, identity_ids=None):
+    """
+    Build the allocation summary of every membership on 'provider'
+    (Or just those of 'identity_ids') in one pass.
+    (See 'IdentityMembership.get_allocation_dict')
+
+    Returns a map of identity membership id --> allocation summary
+    """
+    usage = list(_fleet_usage(provider, time_period, identity_ids))
+    active_cores = get_active_cores(
+        [membership.identity_id for membership, _, _ in usage])
+    allocation_dicts = {}
+    for membership, delta_time, time_used in usage:
+        threshold = timedelta(minutes=membership.allocation.threshold)
+        burn_time = _burn_time(threshold - time_used,
+                               active_cores.get(membership.identity_id))
+        allocation_dicts[membership.id] = build_allocation_dict(
+            membership.allocation, delta_time, time_used, burn_time)
+    return allocation_dicts
+
+
+def build_allocation_dict(allocation, delta, time_used, burn_time):
+    """
+    Format the allocation summary returned by the API.
+    """
+    mins_consumed = delta_to_minutes(time_used)
+    if burn_time:
+        burn_time = delta_to_hours(burn_time)
+    zero_time = datetime.now() + timedelta(
+            minutes=(allocation.threshold - mins_consumed))
+    return {
+        "threshold": floor(allocation.threshold/60),
+        "current": floor(mins_consumed/60),
+        "delta": ceil(delta.total_seconds()/60),
+        "burn": burn_time,
+        "ttz": zero_time,
+    }
+
+
+def _fleet_usage(provider, time_period=None, identity_ids=None):
+    """
+    Yields (membership, delta_time, time_used) for each membership
+    with an allocation on 'provider'.
+    """
+    memberships = IdentityMembership.objects.filter(
+        identity__provider=provider, allocation__isnull=False,
+        member__name=F('identity__created_by__username'))\
+        .select_related('allocation')
+    if identity_ids is not None:
+        memberships = memberships.filter(identity__id__in=identity_ids)
+    #Identities sharing an allocation share the same window.
+    allocation_map = {}
+    for membership in memberships:
+        allocation_map.setdefault(membership.allocation_id, [])\
+            .append(membership)
+    for members in allocation_map.values():
+        allocation = members[0].allocation
+        delta_time = get_delta(allocation, time_period)
+        fleet_time = get_fleet_time(
+            provider, delta_time,
+            [member.identity_id for member in members])
+        for member in members:
+            yield (member, delta_time,
+                   fleet_time.get(member.identity_id, timedelta(0)))
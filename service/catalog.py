@@ -0,0 +1,149 @@
+"""
+Size & image catalogs, shared by the web and celery workers.
+
+Listings are stored in the cache per provider (Images per provider & user,
+private images are not visible to everyone). A listing older than
+CATALOG_TTL is still served while a single celery task refreshes it,
+only listings older than CATALOG_MAX_STALE are fetched inline.
+"""
+import time
+
+from django.core.cache import cache
+
+from threepio import logger
+
+#Libcloud listings served from the catalog
+CATALOGS = ('list_sizes', 'list_images')
+#Listings that can differ from user to user
+USER_CATALOGS = ('list_images',)
+
+
+def catalog_driver(driver):
+    """
+    Serve the (argument-less) size & image listings of 'driver'
+    from the shared catalog.
+    Pooled drivers share a connection, so this is done once per connection.
+    """
+    connection = getattr(driver, '_connection', None)
+    if not connection or getattr(connection, '_uncached_catalogs', None):
+        return driver
+    connection._uncached_catalogs = {}
+    for method_name in CATALOGS:
+        list_method = getattr(connection, method_name, None)
+        if not list_method:
+            continue
+        connection._uncached_catalogs[method_name] = list_method
+        setattr(connection, method_name,
+                _cached_listing(driver, connection, method_name))
+    return driver
+
+
+def refresh_catalog(driver, method_name):
+    """
+    List from the provider and replace the catalog entry.
+    """
+    connection = driver._connection
+    list_method = connection._uncached_catalogs[method_name]
+    return _refresh(_catalog_key(driver, method_name), connection, list_method)
+
+
+def invalidate_catalog(esh_provider, method_name=None):
+    """
+    Drop the catalog 'method_name' (Or all catalogs) for every user
+    of 'esh_provider'. (e.g. A new image was created)
+    """
+    method_names = [method_name] if method_name else CATALOGS
+    for name in method_names:
+        version_key = _version_key(esh_provider, name)
+        cache.add(version_key, 0, 30*24*60*60)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            #Evicted between add and incr
+            cache.set(version_key, 1, 30*24*60*60)
+
+
+def _cached_listing(driver, connection, method_name):
+    def cached_listing(*args, **kwargs):
+        list_method = connection._uncached_catalogs[method_name]
+        if args or kwargs:
+            #Filtered listings are not shared.
+            return list_method(*args, **kwargs)
+        from atmosphere import settings
+        key = _catalog_key(driver, method_name)
+        entry = cache.get(key)
+        if entry is None:
+            return _refresh(key, connection, list_method)
+        fetched_at, items = entry
+        if time.time() - fetched_at > settings.CATALOG_TTL.total_seconds():
+            _revalidate(driver, method_name, key)
+        return load_items(connection, items)
+    return cached_listing
+
+
+def _revalidate(driver, method_name, key):
+    """
+    Ask celery to refresh a stale catalog, unless someone already has.
+    """
+    #Don't move it up. Circular reference.
+    from service.tasks.driver import refresh_catalog_task
+    if not cache.add("%s:refresh" % key, True, 60):
+        return
+    try:
+        refresh_catalog_task.delay(driver.__class__, driver.provider,
+                                   driver.identity, method_name)
+    except Exception:
+        logger.exception("Unable to refresh catalog %s" % key)
+
+
+def _refresh(key, connection, list_method):
+    from atmosphere import settings
+    items = list_method()
+    cache.set(key, (time.time(), dump_items(items)),
+              settings.CATALOG_MAX_STALE.total_seconds())
+    return items
+
+
+def _provider_name(esh_provider):
+    return getattr(esh_provider, 'identifier', None)\
+        or esh_provider.__class__.__name__
+
+
+def _version_key(esh_provider, method_name):
+    return "catalog_version:%s:%s" % (_provider_name(esh_provider),
+                                      method_name)
+
+
+def _catalog_key(driver, method_name):
+    version = cache.get(_version_key(driver.provider, method_name)) or 0
+    key = "catalog:%s:%s:%s" % (_provider_name(driver.provider),
+                                method_name, version)
+    if method_name in USER_CATALOGS:
+        key += ":%s" % getattr(driver._connection, 'key', None)
+    return key
+
+
+def dump_items(items):
+    """
+    Libcloud objects keep a reference to their (unpicklable) driver,
+    store the class and state without it. (See 'load_items')
+    """
+    dumped = []
+    for item in items:
+        state = dict(item.__dict__)
+        state.pop('driver', None)
+        dumped.append((item.__class__, state))
+    return dumped
+
+
+def load_items(connection, dumped):
+    """
+    Rebuild the libcloud objects of 'dump_items' on 'connection'
+    """
+    items = []
+    for item_cls, state in dumped:
+        item = item_cls.__new__(item_cls)
+        item.__dict__.update(state)
+        item.driver = connection
+        items.append(item)
+    return items
@@ -0,0 +1,123 @@
+"""
+Per-provider circuit breaker around libcloud requests.
+
+closed:    Requests go through, failed and slow (over the latency budget)
+           requests are counted.
+open:      PROVIDER_FAILURE_THRESHOLD bad requests in a row, every request
+           fails fast with ProviderUnavailable for PROVIDER_CIRCUIT_RESET.
+half-open: A single request is let through, success closes the circuit,
+           failure opens it again.
+
+The state lives in the cache, so every web and celery worker shares it.
+Admin & monitor drivers are not guarded, their (slow) listings would
+open the circuit for everyone else. (See api.get_esh_driver)
+"""
+import httplib
+import socket
+import time
+
+from django.core.cache import cache
+
+from threepio import logger
+
+from service.exceptions import ProviderUnavailable
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def guard_driver(driver, provider_id):
+    """
+    Route every request of 'driver' through the circuit of 'provider_id',
+    Pooled drivers share a connection, so this is done once per connection.
+    """
+    from atmosphere import settings
+    connection = getattr(getattr(driver, '_connection', None),
+                         'connection', None)
+    if not connection or getattr(connection, '_circuit', None):
+        return driver
+    budget = settings.PROVIDER_LATENCY_BUDGET.total_seconds()
+    connection._circuit = provider_id
+    #Hung endpoints time out at the budget instead of the libcloud default
+    connection.timeout = budget
+    request = connection.request
+
+    def guarded_request(*args, **kwargs):
+        allow_request(provider_id)
+        started = time.time()
+        try:
+            response = request(*args, **kwargs)
+        except (socket.error, httplib.HTTPException), e:
+            record_failure(provider_id, e)
+            raise
+        elapsed = time.time() - started
+        if elapsed > budget:
+            record_failure(provider_id, "Request took %.1fs" % elapsed)
+        else:
+            record_success(provider_id)
+        return response
+    connection.request = guarded_request
+    return driver
+
+
+def circuit_state(provider_id):
+    from atmosphere import settings
+    if cache.get(_open_key(provider_id)):
+        return OPEN
+    failures = cache.get(_failures_key(provider_id)) or 0
+    if failures >= settings.PROVIDER_FAILURE_THRESHOLD:
+        return HALF_OPEN
+    return CLOSED
+
+
+def allow_request(provider_id):
+    """
+    Raise ProviderUnavailable unless a request to 'provider_id' may go out.
+    """
+    from atmosphere import settings
+    state = circuit_state(provider_id)
+    if state == CLOSED:
+        return
+    if state == HALF_OPEN and cache.add(
+            _trial_key(provider_id), True,
+            settings.PROVIDER_LATENCY_BUDGET.total_seconds()):
+        return
+    raise ProviderUnavailable(provider_id,
+                              settings.PROVIDER_CIRCUIT_RESET)
+
+
+def record_success(provider_id):
+    if cache.get(_failures_key(provider_id)):
+        cache.delete_many([_failures_key(provider_id),
+                           _trial_key(provider_id)])
+
+
+def record_failure(provider_id, reason):
+    from atmosphere import settings
+    key = _failures_key(provider_id)
+    cache.add(key, 0, 24*60*60)
+    try:
+        failures = cache.incr(key)
+    except ValueError:
+        #Evicted between add and incr
+        failures = 1
+        cache.set(key, failures, 24*60*60)
+    if failures >= settings.PROVIDER_FAILURE_THRESHOLD:
+        logger.warn("Circuit opened for Provider:%s after %s failures (%s)"
+                    % (provider_id, failures, reason))
+        cache.set(_open_key(provider_id), True,
+                  settings.PROVIDER_CIRCUIT_RESET.total_seconds())
+        cache.delete(_trial_key(provider_id))
+
+
+def _failures_key(provider_id):
+    return "circuit_failures:%s" % provider_id
+
+
+def _open_key(provider_id):
+    return "circuit_open:%s" % provider_id
+
+
+def _trial_key(provider_id):
+    return "circuit_trial:%s" % provider_id
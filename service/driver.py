@@ -1,5 +1,19 @@
+import copy
+import threading
+import time
+from Queue import Queue, Empty
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import md5
+
+from django.core.cache import cache
+from django.utils import timezone
+
 from threepio import logger
 
+from service.catalog import catalog_driver
+from service.exceptions import ProviderTimeout
+
 
 def get_hypervisor_statistics(admin_driver):
     if hasattr(admin_driver._connection, "ex_hypervisor_statistics"):
@@ -20,7 +34,9 @@ def get_driver(driverCls, provider, identity, **provider_credentials):
         provider_credentials = provider.options
     driver = driverCls(provider, identity, **provider_credentials)
     if driver:
-        return driver
+        fingerprint = credential_fingerprint(
+            provider_credentials, getattr(identity, 'credentials', None) or {})
+        return catalog_driver(share_auth_token(driver, fingerprint))
 
 
 def get_admin_driver(provider):
@@ -29,13 +45,315 @@ def get_admin_driver(provider):
     """
     try:
         from api import get_esh_driver
-        return get_esh_driver(provider.accountprovider_set.all()[0].identity)
+        return get_esh_driver(provider.accountprovider_set.all()[0].identity,
+                              guarded=False)
     except:
         logger.info("Admin driver for provider %s not found." %
                     (provider.location))
         return None
 
 
+def fan_out(providers, work, timeout=None):
+    """
+    Call work(provider) for every provider at once.
+    Yields (provider, result, error) as each provider finishes, so one
+    slow cloud does not hold back the others. Providers still running
+    after 'timeout' seconds are yielded with a ProviderTimeout error.
+    """
+    from atmosphere import settings
+    if timeout is None:
+        timeout = settings.PROVIDER_FANOUT_TIMEOUT.total_seconds()
+    providers = list(providers)
+    results = Queue()
+    for provider in providers:
+        worker = threading.Thread(target=_fan_out_worker,
+                                  args=(provider, work, results),
+                                  name="fan_out:%s" % provider)
+        worker.daemon = True
+        worker.start()
+    deadline = time.time() + timeout
+    pending = set(provider.id for provider in providers)
+    while pending:
+        try:
+            provider, result, error = results.get(
+                timeout=max(deadline - time.time(), 0))
+        except Empty:
+            break
+        pending.discard(provider.id)
+        yield (provider, result, error)
+    for provider in providers:
+        if provider.id in pending:
+            yield (provider, None, ProviderTimeout(provider, timeout))
+
+
+def _fan_out_worker(provider, work, results):
+    #Do not move up. ImportError.
+    from django.db import connection
+    try:
+        results.put((provider, work(provider), None))
+    except Exception, e:
+        logger.exception("Problem working on provider: %s" % provider)
+        results.put((provider, None, e))
+    finally:
+        #Each thread has its own DB connection, don't leak them.
+        connection.close()
+
+
+def share_auth_token(driver, fingerprint):
+    """
+    Share Keystone tokens between every driver (web and celery) built for
+    the same user, tenant and auth URL, with the same credentials
+    ('fingerprint', See 'credential_fingerprint'), so a driver with a stale
+    or wrong password still has to authenticate by itself.
+    A cached token is used until it is within KEYSTONE_TOKEN_MARGIN of
+    expiring, new tokens are published as soon as libcloud fetches them.
+    Drivers without a Keystone connection are returned untouched.
+    """
+    connection = getattr(getattr(driver, '_connection', None),
+                         'connection', None)
+    if not connection or not hasattr(connection, 'get_auth_class')\
+            or getattr(connection, '_shared_auth_token', False):
+        return driver
+    key = _auth_token_key(connection, fingerprint)
+    try:
+        _load_auth_token(connection, cache.get(key))
+    except Exception:
+        logger.exception("Unable to load the shared auth token for %s"
+                         % driver)
+    populate = connection._populate_hosts_and_request_paths
+
+    def _populate_hosts_and_request_paths():
+        old_token = connection.auth_token
+        populate()
+        if connection.auth_token != old_token:
+            _save_auth_token(key, connection)
+    connection._populate_hosts_and_request_paths = \
+        _populate_hosts_and_request_paths
+    connection._shared_auth_token = True
+    return driver
+
+
+def _auth_token_key(connection, fingerprint):
+    return "keystone_token:%s" % md5(repr((
+        getattr(connection, '_ex_force_auth_url', None),
+        getattr(connection, '_ex_tenant_name', None),
+        getattr(connection, 'user_id', None),
+        fingerprint))).hexdigest()
+
+
+def _seconds_until(expires):
+    now = timezone.now() if timezone.is_aware(expires) \
+        else datetime.utcnow()
+    return (expires - now).total_seconds()
+
+
+def _save_auth_token(key, connection):
+    from atmosphere import settings
+    osa = connection.get_auth_class()
+    expires = osa.auth_token_expires
+    if not osa.auth_token or not expires:
+        return
+    timeout = _seconds_until(expires)\
+        - settings.KEYSTONE_TOKEN_MARGIN.total_seconds()
+    if timeout <= 0:
+        return
+    cache.set(key, {
+        'auth_token': osa.auth_token,
+        'auth_token_expires': expires,
+        'auth_user_info': osa.auth_user_info,
+        'urls': osa.urls,
+    }, int(timeout))
+
+
+def _load_auth_token(connection, token):
+    """
+    Prime the libcloud connection (and its auth connection) with 'token'
+    so the next request skips authentication.
+    """
+    from libcloud.common.openstack import OpenStackServiceCatalog
+    if not token:
+        return
+    osa = connection.get_auth_class()
+    for attr in ['auth_token', 'auth_token_expires',
+                 'auth_user_info', 'urls']:
+        setattr(osa, attr, token[attr])
+    connection.auth_token = token['auth_token']
+    connection.auth_token_expires = token['auth_token_expires']
+    connection.auth_user_info = token['auth_user_info']
+    connection.service_catalog = OpenStackServiceCatalog(
+        token['urls'], ex_force_auth_version=connection._auth_version)
+
+
+def snapshot_driver(driver, list_all=False):
+    """
+    Attach a DriverSnapshot to 'driver' for the rest of the request/task.
+    list_all - Use list_all_instances (Account Providers)
+    """
+    snapshot = getattr(driver, 'snapshot', None)
+    if snapshot and snapshot.list_all == list_all:
+        return driver
+    return DriverSnapshot(driver, list_all=list_all).attach()
+
+
+class DriverSnapshot(object):
+    """
+    A request (or task) scoped view of the cloud, as seen by one driver.
+    After 'attach', the drivers get_instance/get_size/get_machine calls
+    are answered from (at most) one listing per type.
+
+    Call 'forget_instance' after changing an instance, the next
+    get_instance for that alias will see the new state.
+    """
+
+    def __init__(self, driver, list_all=False):
+        self.driver = driver
+        self.list_all = list_all
+        #The real (un-snapshotted) driver methods
+        self._get_instance = driver.get_instance
+        self._get_size = driver.get_size
+        self._get_machine = driver.get_machine
+        self._list_instances = driver.list_all_instances if list_all\
+            else driver.list_instances
+        self.instance_map = None
+        self.size_map = None
+        self.machine_map = {}
+        self.stale_instances = set()
+
+    def attach(self):
+        self.driver.snapshot = self
+        self.driver.get_instance = self.get_instance
+        self.driver.get_size = self.get_size
+        self.driver.get_machine = self.get_machine
+        return self.driver
+
+    def get_instance(self, alias):
+        if self.instance_map is None:
+            self._load_instances()
+        elif alias in self.stale_instances:
+            if self.list_all:
+                #Only the listing can see instances outside of our tenant.
+                self._load_instances()
+            else:
+                self.instance_map[alias] = self._get_instance(alias)
+                self.stale_instances.discard(alias)
+        return self.instance_map.get(alias)
+
+    def forget_instance(self, alias):
+        self.stale_instances.add(alias)
+
+    def _load_instances(self):
+        self.instance_map = {}
+        for instance in self._list_instances():
+            self.instance_map[instance.id] = instance
+        self.stale_instances = set()
+
+    def get_size(self, alias):
+        if self.size_map is None:
+            self.size_map = {}
+            for size in self.driver.list_sizes():
+                self.size_map[size.id] = size
+        if alias not in self.size_map:
+            #Not in the listing, ask the driver directly.
+            self.size_map[alias] = self._get_size(alias)
+        return self.size_map[alias]
+
+    def get_machine(self, alias):
+        #NOTE: Image lists are large, so machines are looked up one at a time
+        if alias not in self.machine_map:
+            self.machine_map[alias] = self._get_machine(alias)
+        return self.machine_map[alias]
+
+
+def credential_fingerprint(provider_creds, identity_creds):
+    """
+    A hash of every credential used to build a driver.
+    Drivers are only reused while their fingerprint still matches.
+    """
+    return md5(repr((sorted(provider_creds.items()),
+                     sorted(identity_creds.items())))).hexdigest()
+
+
+class DriverPool(object):
+    """
+    LRU cache of drivers (and their authenticated connections),
+    keyed by identity, user, a fingerprint of their credentials and
+    whether they are guarded by the provider's circuit.
+
+    Connections are not safe to share between threads, so each thread keeps
+    its own pool. 'invalidate' works across threads by bumping a generation
+    that is part of every key; stale entries simply stop matching.
+    Drivers are handed out as shallow copies, so per-request state
+    (See 'DriverSnapshot') never leaks into the pool.
+    """
+
+    def __init__(self, max_size=256, ttl=30*60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._identity_generation = {}
+
+    def _pool(self):
+        pool = getattr(self._local, 'pool', None)
+        if pool is None:
+            pool = self._local.pool = OrderedDict()
+        return pool
+
+    def _key(self, identity_id, username, fingerprint, guarded):
+        with self._lock:
+            return (identity_id, username, fingerprint, guarded,
+                    self._generation,
+                    self._identity_generation.get(identity_id, 0))
+
+    def get(self, identity_id, username, fingerprint, guarded=True):
+        pool = self._pool()
+        key = self._key(identity_id, username, fingerprint, guarded)
+        entry = pool.pop(key, None)
+        if not entry:
+            return None
+        driver, created = entry
+        if time.time() - created > self.ttl:
+            return None
+        #Most recently used goes to the end.
+        pool[key] = entry
+        return copy.copy(driver)
+
+    def put(self, identity_id, username, fingerprint, guarded, driver):
+        pool = self._pool()
+        key = self._key(identity_id, username, fingerprint, guarded)
+        pool[key] = (driver, time.time())
+        while len(pool) > self.max_size:
+            pool.popitem(last=False)
+        return copy.copy(driver)
+
+    def invalidate(self, identity_id=None):
+        """
+        Stop reusing the drivers of 'identity_id' (Or all drivers)
+        """
+        with self._lock:
+            if identity_id is None:
+                self._generation += 1
+            else:
+                self._identity_generation[identity_id] = \
+                    self._identity_generation.get(identity_id, 0) + 1
+
+
+def get_driver_pool():
+    """
+    The process-wide DriverPool, sized by DRIVER_POOL_SIZE/DRIVER_POOL_TTL
+    """
+    global _driver_pool
+    if _driver_pool is None:
+        from atmosphere import settings
+        _driver_pool = DriverPool(
+            max_size=settings.DRIVER_POOL_SIZE,
+            ttl=settings.DRIVER_POOL_TTL.total_seconds())
+    return _driver_pool
+
+_driver_pool = None
+
+
 class DriverManager(object):
 
     _instance = None
@@ -47,32 +365,18 @@ class DriverManager(object):
         if not cls._instance:
             cls._instance = super(DriverManager, cls).__new__(
                 cls, *args, **kwargs)
-            cls._instance.driver_map = {}
         return cls._instance
 
     def get_driver(self, core_identity):
         from api import get_esh_driver
-        #No Cache model
-        driver = get_esh_driver(core_identity)
-        return driver
-        #Cached model
-        if not self.driver_map.get(core_identity):
-            driver = get_esh_driver(core_identity)
-            self.driver_map[core_identity] = driver
-            logger.info("Driver created for identity %s : %s"
-                        % (core_identity, driver))
-            return driver
-        driver = self.driver_map[core_identity]
-        logger.info("Driver found for identity %s: %s"
-                    % (core_identity, driver))
-        return driver
+        #Drivers are pooled by get_esh_driver (See 'DriverPool')
+        return get_esh_driver(core_identity)
 
     def release_all_drivers(self):
         """
         Sometimes we need to release the entire pool..
         """
-        self.driver_map = {}
+        get_driver_pool().invalidate()
 
     def release_driver(self, core_identity):
-        if self.driver_map.get(core_identity):
-            del self.driver_map[core_identity]
+        get_driver_pool().invalidate(core_identity.id)
@@ -61,3 +61,28 @@ class SizeNotAvailable(Exception):
 
     def __str__(self):
         return "%s" % (self.message, )
+
+
+class ProviderTimeout(Exception):
+
+    def __init__(self, provider, timeout):
+        self.provider = provider
+        self.message = "Provider %s did not respond within %s seconds."\
+            % (provider, timeout)
+        super(ProviderTimeout, self).__init__(self.message)
+
+    def __str__(self):
+        return "%s" % (self.message, )
+
+
+class ProviderUnavailable(Exception):
+
+    def __init__(self, provider_id, retry_after):
+        self.provider_id = provider_id
+        self.retry_after = retry_after
+        self.message = "Provider %s is degraded. Try again in %s."\
+            % (provider_id, retry_after)
+        super(ProviderUnavailable, self).__init__(self.message)
+
+    def __str__(self):
+        return "%s" % (self.message, )
@@ -1,8 +1,13 @@
 from dateutil.relativedelta import relativedelta
+from hashlib import md5
+import json
 import os.path
 import time
 import uuid
 
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.timezone import datetime
 from djcelery.app import app
 
@@ -14,7 +19,9 @@ from rtwo.provider import AWSProvider, AWSUSEastProvider,\
 from rtwo.driver import OSDriver
 
 from core.models.identity import Identity as CoreIdentity
-from core.models.instance import convert_esh_instance
+from core.models.instance import convert_esh_instance, convert_esh_instances,\
+    prefetch_instances
+from core.models.instance import Instance as CoreInstance
 from core.models.size import convert_esh_size
 from core.models.provider import AccountProvider
 
@@ -27,7 +34,13 @@ from service.allocation import check_over_allocation
 from service.exceptions import OverAllocationError, OverQuotaError,\
     SizeNotAvailable, HypervisorCapacityError
 from service.accounts.openstack import AccountDriver as OSAccountDriver
-                
+
+#Sent by the monitor for every identity whose listing changed.
+#added/changed - esh instances, removed - provider aliases
+instances_changed = Signal(providing_args=["identity", "added", "changed",
+                                           "removed"])
+
+
 def reboot_instance(esh_driver, esh_instance, reboot_type="SOFT"):
     """
     Default to a soft reboot, but allow option for hard reboot.
@@ -314,6 +327,10 @@ def resume_instance(esh_driver, esh_instance,
     if restore_ip:
         deploy_task.apply_async(countdown=10)
 def admin_get_instance(esh_driver, instance_id):
+    snapshot = getattr(esh_driver, 'snapshot', None)
+    if snapshot and snapshot.list_all:
+        #The snapshot already holds (or will make) the admin listing.
+        return esh_driver.get_instance(instance_id)
     instance_list = esh_driver.list_all_instances()
     esh_instance = [instance for instance in instance_list if
                     instance.id == instance_id]
@@ -330,7 +347,9 @@ def update_status(esh_driver, instance_id, provider_id, identity_id, user):
     But it makes more sense to call this function in the code..
     """
     #Grab a new copy of the instance
-
+    snapshot = getattr(esh_driver, 'snapshot', None)
+    if snapshot:
+        snapshot.forget_instance(instance_id)
     if AccountProvider.objects.filter(identity__id=identity_id):
         esh_instance = admin_get_instance(esh_driver, instance_id)
     else:
@@ -349,15 +368,112 @@ def get_core_instances(identity_id):
     identity = CoreIdentity.objects.get(id=identity_id)
     driver = get_esh_driver(identity)
     instances = driver.list_instances()
-    core_instances = [convert_esh_instance(driver,
-                                           esh_instance,
+    core_instances = convert_esh_instances(driver,
+                                           instances,
                                            identity.provider.id,
                                            identity.id,
                                            identity.created_by)
-                      for esh_instance in instances]
+    mark_instance_snapshot(identity.id)
     return core_instances
 
 
+def _snapshot_key(identity_id):
+    return "instance_snapshot:%s" % identity_id
+
+
+def mark_instance_snapshot(identity_id):
+    """
+    Call this after a live listing for 'identity_id' has been converted,
+    the core DB is now an accurate snapshot of the provider.
+    """
+    cache.set(_snapshot_key(identity_id), timezone.now(), 24*60*60)
+
+
+def instance_fingerprint(esh_instance):
+    """
+    A compact digest of everything the monitor copies into the DB.
+    """
+    extra = getattr(esh_instance, 'extra', None) or {}
+    metadata = extra.get('metadata') or {}
+    size_id = esh_instance.size.id if getattr(esh_instance, 'size', None)\
+        else None
+    return md5(json.dumps([
+        extra.get('status'), extra.get('task'), size_id,
+        getattr(esh_instance, 'ip', None),
+        sorted(metadata.items())], default=str)).hexdigest()
+
+
+def diff_instance_snapshot(identity_id, esh_instances):
+    """
+    Compare 'esh_instances' to the fingerprints of the last saved listing.
+    Returns (added, changed, removed, fingerprints)
+    added/changed - Listed instances that are new or different
+    removed - Aliases that are no longer listed
+              (None without a saved listing, compare to the DB instead)
+    fingerprints - Save these (See 'save_instance_fingerprints') once
+                   the changes are in the DB.
+    """
+    previous = cache.get(_fingerprint_key(identity_id))
+    if previous is None:
+        fingerprints = dict((esh_instance.id,
+                             instance_fingerprint(esh_instance))
+                            for esh_instance in esh_instances)
+        return list(esh_instances), [], None, fingerprints
+    fingerprints = {}
+    added, changed = [], []
+    for esh_instance in esh_instances:
+        fingerprint = instance_fingerprint(esh_instance)
+        fingerprints[esh_instance.id] = fingerprint
+        if esh_instance.id not in previous:
+            added.append(esh_instance)
+        elif previous[esh_instance.id] != fingerprint:
+            changed.append(esh_instance)
+    removed = [alias for alias in previous if alias not in fingerprints]
+    return added, changed, removed, fingerprints
+
+
+def save_instance_fingerprints(identity_id, fingerprints):
+    cache.set(_fingerprint_key(identity_id), fingerprints, 24*60*60)
+
+
+def _fingerprint_key(identity_id):
+    return "instance_fingerprints:%s" % identity_id
+
+
+def get_instance_snapshot_age(identity_id):
+    """
+    Returns the timedelta since the last live listing for 'identity_id'
+    or None if there is no snapshot.
+    """
+    snapshot_time = cache.get(_snapshot_key(identity_id))
+    if not snapshot_time:
+        return None
+    return timezone.now() - snapshot_time
+
+
+def snapshot_is_fresh(identity_id, max_age=None):
+    if not max_age:
+        max_age = getattr(settings, 'INSTANCE_SNAPSHOT_MAX_AGE', None)
+    if not max_age:
+        return False
+    snapshot_age = get_instance_snapshot_age(identity_id)
+    return snapshot_age is not None and snapshot_age < max_age
+
+
+def get_snapshot_instances(provider_id, identity_id):
+    """
+    Returns the core instances last seen by 'identity_id',
+    without contacting the provider.
+    """
+    core_instances = prefetch_instances(CoreInstance.objects.filter(
+        end_date=None, provider_machine__provider__id=provider_id))
+    if not AccountProvider.objects.filter(identity__id=identity_id):
+        #Account Providers list_all_instances, everyone else is limited.
+        core_instances = core_instances.filter(
+            created_by_identity__id=identity_id)
+    return core_instances.order_by('-start_date')
+
+
 def destroy_instance(identity_id, instance_alias):
     core_identity = CoreIdentity.objects.get(id=identity_id)
     esh_driver = get_esh_driver(core_identity)
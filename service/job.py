@@ -0,0 +1,98 @@
+"""
+Jobs: Celery chains started by a web request, looked up by id later.
+
+A job remembers the task id of every step in its chain, so the client
+can follow the progress of the chain (GET /api/v1/jobs/<id>) instead of
+the request blocking until the chain is done.
+"""
+import uuid
+
+from celery import chain
+from celery.result import AsyncResult
+from django.core.cache import cache
+
+from threepio import logger
+
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCESS = 'success'
+FAILURE = 'failure'
+
+
+def start_job(username, action, steps, **params):
+    """
+    Start the chain of 'steps' ([(step_name, signature), ...]) for
+    'username', returns the job id.
+    'params' are shown with the job. (e.g. instance_id, volume_id)
+    """
+    from atmosphere import settings
+    job_id = str(uuid.uuid4())
+    result = chain(*[signature for _, signature in steps]).apply_async()
+    task_ids = []
+    while result is not None:
+        task_ids.insert(0, result.id)
+        result = result.parent
+    job = {
+        'id': job_id,
+        'username': username,
+        'action': action,
+        'params': params,
+        'steps': zip([step_name for step_name, _ in steps], task_ids),
+    }
+    cache.set(_job_key(job_id), job, settings.CELERY_TASK_RESULT_EXPIRES)
+    return job_id
+
+
+def get_job(job_id):
+    return cache.get(_job_key(job_id))
+
+
+def job_status(job):
+    """
+    The state of every step and of the job as a whole.
+    The 'result' of a successful job maps each step name to its result.
+    """
+    steps = []
+    results = {}
+    error = None
+    for step_name, task_id in job['steps']:
+        task_result = AsyncResult(task_id)
+        state = task_result.state
+        steps.append({'name': step_name, 'state': state.lower()})
+        if state == 'SUCCESS':
+            results[step_name] = task_result.result
+        elif state == 'FAILURE' and not error:
+            error = _failure_message(task_result.result)
+    if error:
+        state = FAILURE
+    elif len(results) == len(steps):
+        state = SUCCESS
+    elif results or any(step['state'] != 'pending' for step in steps):
+        state = RUNNING
+    else:
+        state = PENDING
+    return {
+        'id': job['id'],
+        'action': job['action'],
+        'params': job['params'],
+        'state': state,
+        'steps': steps,
+        'result': results if state == SUCCESS else None,
+        'error': error,
+    }
+
+
+def _failure_message(exc):
+    #DeviceBusyException & friends keep the useful part in 'message'
+    message = getattr(exc, 'message', None)
+    if message:
+        return message
+    try:
+        return str(exc)
+    except Exception:
+        logger.exception("Unable to describe job failure")
+        return exc.__class__.__name__
+
+
+def _job_key(job_id):
+    return "job:%s" % job_id
@@ -0,0 +1,132 @@
+"""
+Instance state from compute (nova) notifications.
+
+'consume_notifications' applies 'compute.instance.*' notifications to the
+core DB as they happen, and has the instance watcher look at watched
+instances right away (See 'service.watcher').
+'monitor_instances' keeps polling as the safety net for lost messages.
+"""
+import json
+
+from kombu import Connection, Exchange, Queue
+
+from threepio import logger
+
+from core.models.instance import Instance
+from core.models.size import Size
+
+from service.watcher import is_watched
+
+#nova vm_state --> Atmosphere status (As listed by the API)
+VM_STATES = {
+    'active': 'active',
+    'building': 'build',
+    'stopped': 'shutoff',
+    'suspended': 'suspended',
+    'paused': 'paused',
+    'rescued': 'rescue',
+    'resized': 'verify_resize',
+    'error': 'error',
+    'shelved': 'shelved',
+    'shelved_offloaded': 'shelved_offloaded',
+}
+DELETED_STATES = ('deleted', 'soft-delete')
+
+
+def apply_instance_notification(provider, event_type, payload):
+    """
+    Record the state in a 'compute.instance.*' notification,
+    through the same path as 'monitor_instances'.
+    Returns the core instance, or None if it isn't ours.
+    """
+    if not event_type.startswith('compute.instance.'):
+        return None
+    alias = payload.get('instance_id')
+    core_instance = Instance.objects.filter(
+        provider_alias=alias, end_date=None,
+        provider_machine__provider=provider).first()
+    if not core_instance:
+        return None
+    vm_state = payload.get('state')
+    task = payload.get('new_task_state')
+    if vm_state in DELETED_STATES\
+            or event_type == 'compute.instance.delete.end':
+        core_instance.end_date_all()
+    elif vm_state in VM_STATES:
+        core_instance.update_history(VM_STATES[vm_state],
+                                     _notification_size(core_instance,
+                                                        provider, payload),
+                                     task)
+    poke_watches(alias)
+    return core_instance
+
+
+def _notification_size(core_instance, provider, payload):
+    flavor_id = payload.get('instance_flavor_id')
+    size = Size.objects.filter(provider=provider, alias=flavor_id).first()\
+        if flavor_id else None
+    if size:
+        return size
+    last_history = core_instance.last_history()
+    return last_history.size if last_history else None
+
+
+def poke_watches(alias):
+    """
+    Look at the watches on 'alias' now, instead of on the next tick.
+    """
+    #Do not move up. Circular reference.
+    from service.tasks.driver import watch_instances
+    try:
+        if is_watched(alias):
+            watch_instances.delay(instance_alias=alias)
+    except Exception:
+        logger.exception("Unable to poke the watches on %s" % alias)
+
+
+def consume_notifications(provider, url, exchange='nova',
+                          routing_key='notifications.info'):
+    """
+    Apply every compute notification for 'provider', until interrupted.
+    """
+    notification_queue = Queue(
+        'atmosphere.notifications.%s' % provider.id,
+        Exchange(exchange, type='topic', durable=False),
+        routing_key=routing_key, durable=False)
+
+    def on_message(body, message):
+        try:
+            event_type, payload = _parse_notification(body)
+            apply_instance_notification(provider, event_type, payload)
+        except Exception:
+            logger.exception("Unable to apply notification %s" % body)
+        message.ack()
+
+    with Connection(url) as connection:
+        with connection.Consumer(notification_queue, callbacks=[on_message]):
+            while True:
+                connection.drain_events()
+
+
+def publish_notification(url, event_type, payload, exchange='nova',
+                         routing_key='notifications.info'):
+    """
+    Publish a notification the way nova does. (For testing a consumer)
+    """
+    with Connection(url) as connection:
+        notification_exchange = Exchange(exchange, type='topic',
+                                         durable=False)
+        producer = connection.Producer(serializer='json')
+        producer.publish(
+            {'event_type': event_type, 'payload': payload},
+            exchange=notification_exchange, routing_key=routing_key,
+            declare=[notification_exchange])
+
+
+def _parse_notification(body):
+    if isinstance(body, basestring):
+        body = json.loads(body)
+    #oslo.messaging wraps the notification in an envelope
+    if 'oslo.message' in body:
+        body = json.loads(body['oslo.message'])
+    return body.get('event_type', ''), body.get('payload') or {}
@@ -2,14 +2,9 @@
 Atmosphere service tasks methods
 
 """
-from celery import chain
-
 from threepio import logger
 
-import service
-
-from service.exceptions import DeviceBusyException
-
+from service.job import start_job
 from service.tasks.driver import deploy_to, deploy_init_to, add_floating_ip
 from service.tasks.driver import destroy_instance
 from service.tasks.volume import attach_task, mount_task, check_volume_task
@@ -53,37 +48,38 @@ def destroy_instance_task(instance, identity_id, *args, **kwargs):
                            *args, **kwargs)
 
 
-def detach_volume_task(driver, instance_id, volume_id, *args, **kwargs):
-    #TODO: Handle the DeviceBusyException
-    try:
-        if hasattr(driver, 'deploy_to'):
-            #Only attempt to umount if we have sh access
-            umount_task.delay(
-                driver.__class__, driver.provider, driver.identity,
-                instance_id, volume_id).get()
-        detach_task.delay(
-            driver.__class__, driver.provider, driver.identity,
-            instance_id, volume_id).get()
-        return (True, None)
-    except DeviceBusyException, dbe:
-        return (False, dbe.message)
+def detach_volume_task(driver, instance_id, volume_id, username=None,
+                       *args, **kwargs):
+    """
+    Start the umount/detach chain, returns the job id. (See 'service.job')
+    A busy device fails the 'umount' step with the offending processes.
+    """
+    task_args = (driver.__class__, driver.provider, driver.identity,
+                 instance_id, volume_id)
+    steps = []
+    if hasattr(driver, 'deploy_to'):
+        #Only attempt to umount if we have sh access
+        steps.append(('umount', umount_task.si(*task_args)))
+    steps.append(('detach', detach_task.si(*task_args)))
+    return start_job(username, 'detach_volume', steps,
+                     instance_id=instance_id, volume_id=volume_id)
 
 
 def attach_volume_task(driver, instance_id, volume_id, device=None,
-                       mount_location=None, *args, **kwargs):
+                       mount_location=None, username=None, *args, **kwargs):
+    """
+    Start the attach/check/mount chain, returns the job id.
+    The job result holds the device ('attach') and mount location ('mount')
+    """
     logger.info("P_device - %s" % device)
     logger.info("P_mount_location - %s" % mount_location)
-    attach_task.delay(
-        driver.__class__, driver.provider, driver.identity,
-        instance_id, volume_id, device).get()
-    if not hasattr(driver, 'deploy_to'):
+    task_args = (driver.__class__, driver.provider, driver.identity,
+                 instance_id, volume_id)
+    steps = [('attach', attach_task.si(*(task_args + (device,))))]
+    if hasattr(driver, 'deploy_to'):
         #Do not attempt to mount if we don't have sh access
-        return
-
-    check_volume_task.delay(
-        driver.__class__, driver.provider, driver.identity,
-        instance_id, volume_id).get()
-    mount_task.delay(
-        driver.__class__, driver.provider, driver.identity,
-        instance_id, volume_id, mount_location).get()
-    return mount_location
+        steps.append(('check', check_volume_task.si(*task_args)))
+        steps.append(('mount',
+                      mount_task.si(*(task_args + (mount_location,)))))
+    return start_job(username, 'attach_volume', steps,
+                     instance_id=instance_id, volume_id=volume_id)
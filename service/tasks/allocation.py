@@ -3,15 +3,19 @@ from dateutil.relativedelta import relativedelta
 
 from django.utils import timezone
 
+from celery import chord
 from celery.decorators import task
 from celery.task.schedules import crontab
 
-from core.models.group import Group
+from core.models.group import Group, set_allocation_dicts
 from core.models.user import AtmosphereUser
 from core.models.provider import Provider
+from core.models.size import SizeResolver
 
-from service.allocation import check_over_allocation
-from service.driver import get_admin_driver
+from service.allocation import check_over_allocation,\
+    check_fleet_allocation, get_fleet_allocation_dicts
+from service.catalog import dump_items, load_items
+from service.driver import fan_out, get_admin_driver, snapshot_driver
 
 from threepio import logger
 
@@ -20,9 +24,26 @@ from threepio import logger
 def monitor_instances():
     """
     Update instances for each active provider.
+    Every provider is listed concurrently, each one is monitored as soon
+    as its listing arrives.
     """
-    for p in Provider.get_active():
-        monitor_instances_for(p)
+    providers = [p for p in Provider.get_active() if _is_monitored(p)]
+    failed = []
+    for provider, instance_map, error in fan_out(providers,
+                                                 get_instance_owner_map):
+        if error:
+            failed.append(provider)
+            logger.error("Unable to list instances on Provider:%s (%s)"
+                         % (provider, error))
+            continue
+        try:
+            monitor_instances_for(provider, instance_map=instance_map)
+        except:
+            failed.append(provider)
+            logger.exception("Unable to monitor Provider:%s" % provider)
+    if failed:
+        logger.warn("Monitoring skipped %s of %s providers: %s"
+                    % (len(failed), len(providers), failed))
 
 
 def get_instance_owner_map(provider):
@@ -48,21 +69,142 @@ def get_instance_owner_map(provider):
     logger.info("Identity map created")
     return identity_map
 
-def monitor_instances_for(provider):
+def _is_monitored(provider):
+    #For now, lets just ignore everything that isn't openstack.
+    return 'openstack' in provider.type.name.lower()
+
+
+def monitor_instances_for(provider, instance_map=None):
     """
     Update instances for provider.
+    The admin listing is split into tenant batches, monitored in parallel
+    by 'monitor_tenant_batch', 'monitor_summary' reports on the whole pass.
     """
-    #For now, lets just ignore everything that isn't openstack.
-    if 'openstack' not in provider.type.name.lower():
+    from atmosphere import settings
+    if not _is_monitored(provider):
         return
-    instance_map = get_instance_owner_map(provider)
-    for username in instance_map.keys():
-        instances = instance_map[username]
-        monitor_instances_for_user(provider, username, instances)
-    logger.info("Monitoring completed")
-
-def monitor_instances_for_user(provider, username, instances):
-    from core.models.instance import convert_esh_instance
+    if instance_map is None:
+        instance_map = get_instance_owner_map(provider)
+    usernames = sorted(instance_map.keys())
+    #Bounded concurrency: Never more than MONITOR_MAX_BATCHES tasks
+    batch_size = max(settings.MONITOR_BATCH_SIZE,
+                     -(-len(usernames) // settings.MONITOR_MAX_BATCHES))
+    batches = []
+    for idx in range(0, len(usernames), batch_size):
+        tenant_map = dict(
+            (username, _dump_instances(instance_map[username]))
+            for username in usernames[idx:idx + batch_size])
+        batches.append(monitor_tenant_batch.si(provider.id, tenant_map))
+    if not batches:
+        return
+    logger.info("Monitoring %s tenants on %s in %s batches"
+                % (len(usernames), provider, len(batches)))
+    return chord(batches)(monitor_summary.s(provider.id))
+
+
+@task(name="monitor_tenant_batch", ignore_result=False,
+      soft_time_limit=5*60, time_limit=6*60)
+def monitor_tenant_batch(provider_id, tenant_map):
+    """
+    Update the instances of every tenant in 'tenant_map'
+    (username --> dumped instances), then test them for over allocation.
+    A failing tenant is reported, the rest of the batch is monitored.
+    """
+    from api import get_esh_driver
+    provider = Provider.objects.get(id=provider_id)
+    result = {'monitored': 0, 'over_allocated': 0, 'failed': []}
+    identity_map = {}
+    #Flavors belong to the provider, list them once for the whole batch.
+    size_resolver = None
+    for username, dumped in tenant_map.items():
+        instances = None
+        identity = None
+        try:
+            ident = provider.identity_set.filter(
+                created_by__username=username)[0]
+            driver = get_esh_driver(ident, guarded=False)
+            instances = _load_instances(driver, dumped)
+            if not size_resolver:
+                size_resolver = SizeResolver(driver, provider.id)
+        except IndexError:
+            #No identity, nothing to convert or enforce.
+            pass
+        except:
+            logger.exception("Unable to load instances of User:%s" % username)
+        if instances is not None:
+            identity = monitor_instances_for_user(
+                provider, username, instances, size_resolver=size_resolver)
+        if identity:
+            identity_map[identity.id] = (identity, instances)
+            result['monitored'] += 1
+        else:
+            result['failed'].append(username)
+    #ASSERT: The DB is up to date, test the whole batch at once.
+    time_period = relativedelta(day=1, months=1)
+    allocation_map = check_fleet_allocation(
+        provider, time_period=time_period, identity_ids=identity_map.keys())
+    for identity_id, (identity, instances) in identity_map.items():
+        allocation_result = allocation_map.get(identity_id)
+        if not allocation_result:
+            continue
+        try:
+            if over_allocation_test(identity, instances,
+                                    allocation_result=allocation_result):
+                result['over_allocated'] += 1
+        except:
+            logger.exception("Unable to enforce allocation for %s"
+                             % identity)
+    #Keep the allocation summaries warm for the API.
+    set_allocation_dicts(get_fleet_allocation_dicts(
+        provider, time_period=time_period,
+        identity_ids=identity_map.keys()))
+    return result
+
+
+@task(name="monitor_summary", ignore_result=True)
+def monitor_summary(batch_results, provider_id):
+    """
+    Report on every batch of a monitoring pass.
+    """
+    monitored = sum(result['monitored'] for result in batch_results)
+    over_allocated = sum(result['over_allocated']
+                         for result in batch_results)
+    failed = [username for result in batch_results
+              for username in result['failed']]
+    logger.info("Monitoring completed for Provider:%s - %s tenants monitored,"
+                " %s over allocation, %s failed: %s"
+                % (provider_id, monitored, over_allocated, len(failed),
+                   failed))
+
+
+def _dump_instances(esh_instances):
+    """
+    Listed instances are sent to 'monitor_tenant_batch' without
+    their (unpicklable) driver.
+    """
+    return [(esh_instance.owner, dump_items([esh_instance._node])[0])
+            for esh_instance in esh_instances]
+
+
+def _load_instances(driver, dumped):
+    esh_instances = []
+    for owner, dumped_node in dumped:
+        node = load_items(driver._connection, [dumped_node])[0]
+        esh_instance = driver.provider.instanceCls(node, driver.provider)
+        esh_instance.owner = owner
+        esh_instances.append(esh_instance)
+    return esh_instances
+
+
+def monitor_instances_for_user(provider, username, instances,
+                               size_resolver=None):
+    """
+    size_resolver - Shared by every user of a batch (See 'SizeResolver'),
+                    one is made for this user when None.
+    """
+    from core.models.instance import convert_esh_instances
+    from service.instance import mark_instance_snapshot,\
+        diff_instance_snapshot, save_instance_fingerprints, instances_changed
     from api import get_esh_driver
     try:
         user = AtmosphereUser.objects.get(username=username)
@@ -73,22 +215,38 @@ def monitor_instances_for_user(provider, username, instances):
         im = ident.identitymembership_set.get(member=group)
         #NOTE: Couples with API, probably want this in
         # service/driver
-        driver = get_esh_driver(ident)
-        core_instances = []
-        #NOTE: We are converting them so they will
-        # be picked up as core models for the 'over_allocation_test'
-        for instance in instances:
-            c_inst = convert_esh_instance(
-                    driver, instance,
-                    ident.provider.id, ident.id, ident.created_by)
-            core_instances.append(c_inst)
-        over_allocation = over_allocation_test(im.identity,
-                                               instances)
+        driver = get_esh_driver(ident, guarded=False)
+        #Only instances that changed since the last pass are written
+        added, changed, removed, fingerprints = diff_instance_snapshot(
+            ident.id, instances)
         core_instances = user.instance_set.filter(
                 provider_machine__provider=provider,
                 end_date=None)
-        core_instances_ident = ident.instance_set.filter(end_date=None)
-        update_instances(driver, im.identity, instances, core_instances)
+        if removed is None:
+            #No saved listing, end-date whatever the DB still thinks is up
+            stale_instances = core_instances.exclude(
+                provider_alias__in=[i.id for i in instances])
+        else:
+            stale_instances = core_instances.filter(
+                provider_alias__in=removed)
+        if added or changed:
+            if not size_resolver:
+                size_resolver = SizeResolver(driver, provider.id)
+            convert_esh_instances(
+                    driver, added + changed,
+                    ident.provider.id, ident.id, ident.created_by,
+                    size_resolver=size_resolver)
+        #Listed instances were written above, only end-date the rest.
+        update_instances(driver, im.identity, [], stale_instances)
+        if added or changed or removed:
+            instances_changed.send(sender=provider, identity=im.identity,
+                                   added=added, changed=changed,
+                                   removed=removed or [])
+        mark_instance_snapshot(ident.id)
+        save_instance_fingerprints(ident.id, fingerprints)
+        #NOTE: Allocation is tested for the whole batch,
+        # see 'monitor_tenant_batch'
+        return im.identity
     except:
         logger.exception("Unable to monitor User:%s on Provider:%s"
                          % (username,provider))
@@ -121,13 +279,20 @@ def _convert_tenant_id_to_names(instances, tenants):
                 i.owner = tenant['name']
     return instances
 
-def over_allocation_test(identity, esh_instances):
+def over_allocation_test(identity, esh_instances, allocation_result=None):
+    """
+    Suspend the instances of an identity that is over allocation.
+    'allocation_result' can be passed in when the (over_allocated, time_diff)
+    verdict is already known (See 'check_fleet_allocation').
+    """
     from api import get_esh_driver
-    from core.models.instance import convert_esh_instance
+    from core.models.instance import convert_esh_instances
     from atmosphere import settings
-    over_allocated, time_diff = check_over_allocation(
-        identity.created_by.username, identity.id,
-        time_period=relativedelta(day=1, months=1))
+    if not allocation_result:
+        allocation_result = check_over_allocation(
+            identity.created_by.username, identity.id,
+            time_period=relativedelta(day=1, months=1))
+    over_allocated, time_diff = allocation_result
     logger.info("Overallocation Test: %s - %s - %s\tInstances:%s"
                 % (identity.created_by.username, over_allocated, time_diff, esh_instances))
     if not over_allocated:
@@ -136,8 +301,10 @@ def over_allocation_test(identity, esh_instances):
     if settings.DEBUG:
         logger.info('Do not enforce allocations in DEBUG mode')
         return False
-    driver = get_esh_driver(identity)
-    running_instances = []
+    driver = get_esh_driver(identity, guarded=False)
+    #Suspended instances are re-read from one listing, not one per instance
+    snapshot_driver(driver)
+    updated_esh_list = []
     for instance in esh_instances:
         #Suspend active instances, update the task in the DB
         try:
@@ -146,34 +313,34 @@ def over_allocation_test(identity, esh_instances):
         except Exception, e:
             if 'in vm_state suspended' not in e.message:
                 raise
+    #ASSERT: All instances suspended, the listing will see the new state.
+    for instance in esh_instances:
         updated_esh = driver.get_instance(instance.id)
-        updated_core = convert_esh_instance(driver, updated_esh,
-                                            identity.provider.id,
-                                            identity.id,
-                                            identity.created_by)
-        running_instances.append(updated_core)
+        if updated_esh:
+            updated_esh_list.append(updated_esh)
+    convert_esh_instances(driver, updated_esh_list, identity.provider.id,
+                          identity.id, identity.created_by)
     #All instances are dealt with, move along.
     return True # User was over_allocation
 
 
-def update_instances(driver, identity, esh_list, core_list):
+def update_instances(driver, identity, esh_list, core_list,
+                     size_resolver=None):
     """
     End-date core instances that don't show up in esh_list
     && Update the values of instances that do
     """
-    esh_ids = [instance.id for instance in esh_list]
-    #logger.info('%s Instances for Identity %s: %s' % (len(esh_ids), identity, esh_ids))
+    esh_map = dict((instance.id, instance) for instance in esh_list)
+    if not size_resolver:
+        size_resolver = SizeResolver(driver, identity.provider.id)
     for core_instance in core_list:
-        try:
-            index = esh_ids.index(core_instance.provider_alias)
-        except ValueError:
+        esh_instance = esh_map.get(core_instance.provider_alias)
+        if not esh_instance:
             logger.info("Did not find instance %s in ID List: %s" %
-                        (core_instance.provider_alias, esh_ids))
+                        (core_instance.provider_alias, esh_map.keys()))
             core_instance.end_date_all()
             continue
-        esh_instance = esh_list[index]
-        esh_size = driver.get_size(esh_instance.size.id)
-        core_size = convert_esh_size(esh_size, provider_id)
+        core_size = size_resolver.resolve(esh_instance.size)
         core_instance.update_history(
             esh_instance.extra['status'],
             core_size,
@@ -11,6 +11,7 @@ import time
 from celery import chain
 from celery.decorators import task
 from celery.task import current
+from celery.exceptions import Ignore
 from celery.result import allow_join_result
 from celery.task.schedules import crontab
 from libcloud.compute.types import Provider, NodeState, DeploymentError
@@ -27,8 +28,11 @@ from service.instance import update_instance_metadata
 from core.models.identity import Identity
 from core.models.profile import UserProfile
 
+from service.catalog import refresh_catalog
 from service.driver import get_driver
 from service.networking import _generate_ssh_kwargs
+from service.watcher import is_instance_ready, run_watches,\
+    watch_instance
 from service.deploy import init, check_process
 
 
@@ -127,13 +131,13 @@ def complete_resize(driverCls, provider, identity, instance_alias,
 def wait_for(instance_alias, driverCls, provider, identity, status_query,
         tasks_allowed=False, return_id=False, **task_kwargs):
     """
-    #Task makes 250 attempts to 'look at' the instance, waiting 15sec each try
-    Cumulative time == 1 hour 2 minutes 30 seconds before FAILURE
+    #Task looks at the instance once, if it isn't ready the rest of the
+    chain is handed to the instance watcher (See 'service.watcher'), which
+    gives up after INSTANCE_WATCH_TIMEOUT.
 
     status_query = "active" Match only one value, active
     status_query = ["active","suspended"] or match multiple values.
     """
-    from service import instance as instance_service
     try:
         logger.debug("wait_for task started at %s." % datetime.now())
         if app.conf.CELERY_ALWAYS_EAGER:
@@ -151,7 +155,22 @@ def wait_for(instance_alias, driverCls, provider, identity, status_query,
         if "Not Ready" not in str(exc):
             # Ignore 'normal' errors.
             logger.exception(exc)
-        wait_for.retry(exc=exc)
+    request = wait_for.request
+    watch_instance(request.id, instance_alias, driverCls, provider, identity,
+                   status_query, tasks_allowed, return_id,
+                   callbacks=request.callbacks, errbacks=request.errbacks)
+    #The watcher resumes the chain, do not run the callbacks now.
+    raise Ignore()
+
+
+@task(name="watch_instances", ignore_result=True)
+def watch_instances(instance_alias=None):
+    """
+    Resume the chains waiting on instances that are ready.
+    (One listing per tenant, see 'service.watcher')
+    """
+    run_watches(instance_alias)
+
 
 def _eager_override(task_class, run_method, args, kwargs):
     attempts = 0
@@ -174,13 +193,13 @@ def _is_instance_ready(driverCls, provider, identity,
     driver = get_driver(driverCls, provider, identity)
     instance = driver.get_instance(instance_alias)
     if not instance:
-        logger.debug("Instance has been teminated: %s." % instance_id)
+        logger.debug("Instance has been teminated: %s." % instance_alias)
         if return_id:
             return None
         return False
     i_status = instance._node.extra['status'].lower()
     i_task = instance._node.extra['task']
-    if (i_status not in status_query) or (i_task and not tasks_allowed):
+    if not is_instance_ready(instance, status_query, tasks_allowed):
         raise Exception(
                 "Instance: %s: Status: (%s - %s) - Not Ready"
                 % (instance.id, i_status, i_task))
@@ -643,6 +662,18 @@ def update_metadata(driverCls, provider, identity, instance_alias, metadata):
     except Exception as exc:
         logger.exception(exc)
         update_metadata.retry(exc=exc)
+
+
+@task(name="refresh_catalog_task", ignore_result=True)
+def refresh_catalog_task(driverCls, provider, identity, method_name):
+    """
+    Replace a stale size/image catalog with a fresh listing.
+    """
+    try:
+        driver = get_driver(driverCls, provider, identity)
+        refresh_catalog(driver, method_name)
+    except Exception as exc:
+        logger.exception(exc)
 # Floating IP Tasks
 @task(name="add_floating_ip",
       #Defaults will not be used, see countdown call below
@@ -15,6 +15,7 @@ from core.email import \
 from core.models.machine_request import MachineRequest, process_machine_request
 from core.models.identity import Identity
 
+from service.catalog import invalidate_catalog
 from service.driver import get_admin_driver
 from service.deploy import freeze_instance, sync_instance
 from service.tasks.driver import deploy_to, wait_for, destroy_instance
@@ -214,6 +215,7 @@ def invalidate_machine_cache(machine_request):
     if not driver:
         return
     driver.provider.machineCls.invalidate_provider_cache(driver.provider)
+    invalidate_catalog(driver.provider, 'list_images')
 
 
 @task(name='freeze_instance_task', ignore_result=False, queue="imaging")
@@ -2,11 +2,11 @@
 Tasks for volume operations.
 """
 import re
-import time
 
 from datetime import datetime
 
 from celery.decorators import task
+from celery.exceptions import Retry
 from celery import chain
 
 from threepio import logger
@@ -209,49 +209,43 @@ def umount_task(driverCls, provider, identity, instance_id,
       ignore_result=False,
       max_retries=1)
 def attach_task(driverCls, provider, identity, instance_id, volume_id,
-                device_choice=None, *args, **kwargs):
+                device_choice=None, attempts=None, *args, **kwargs):
+    """
+    Attach the volume, then look at it once per run until it is attached.
+    attempts - None to attach, else the number of times the volume was
+               seen 'attaching'. (See '_check_again')
+    """
     #TODO: chain task attach THEN mount for more robust-ness
     try:
         logger.debug("attach_task started at %s." % datetime.now())
         driver = get_driver(driverCls, provider, identity)
-        instance = driver.get_instance(instance_id)
-        volume = driver.get_volume(volume_id)
 
         #Step 1. Attach the volume
-        #NOTE: device_choice !== device 100%
-        driver.attach_volume(instance,
-                             volume,
-                             device_choice)
+        if attempts is None:
+            instance = driver.get_instance(instance_id)
+            volume = driver.get_volume(volume_id)
+            #NOTE: device_choice !== device 100%
+            driver.attach_volume(instance,
+                                 volume,
+                                 device_choice)
+            attempts = 0
 
         #When the reslt returns the volume will be 'attaching'
         #We can't do anything until the volume is 'available/in-use'
-        attempts = 0
-        while True:
-            volume = driver.get_volume(volume_id)
-            # Give up if you can't find the volume
-            if not volume:
-                return None
-            if attempts > 6:  # After 6 attempts (~1min)
-                break
-            #Openstack Check
-            if isinstance(driver, OSDriver) and\
-                    'attaching' not in volume.extra.get('status',''):
-                break
-            attach_set = volume.extra['attachmentSet'][0]
-            if isinstance(driver, EucaDriver) and\
-                    'attaching' not in attach_set.get('status', ''):
-                break
-            # Exponential backoff..
-            attempts += 1
-            sleep_time = 2**attempts
-            logger.debug("Volume %s is not ready (%s). Sleep for %s"
+        volume = driver.get_volume(volume_id)
+        # Give up if you can't find the volume
+        if not volume:
+            return None
+        if attempts <= 6 and _is_attaching(driver, volume):
+            # Exponential backoff.. (After 6 attempts (~2min) move on)
+            logger.debug("Volume %s is not ready (%s). Check again in %s"
                          % (volume.id, volume.extra.get('status', 'no-status'),
-                            sleep_time))
-            time.sleep(sleep_time)
+                            2**(attempts + 1)))
+            _check_again(attach_task, attempts + 1)
 
         if 'available' in volume.extra.get('status',''):
             raise Exception("Volume %s failed to attach to instance %s"
-                            % (volume.id, instance.id))
+                            % (volume.id, instance_id))
 
         #Device path for euca == openstack
         try:
@@ -261,9 +255,11 @@ def attach_task(driverCls, provider, identity, instance_id, volume_id,
 
         logger.debug("attach_task finished at %s." % datetime.now())
         return device
+    except Retry:
+        raise
     except Exception as exc:
         logger.warn(exc)
-        attach_task.retry(exc=exc)
+        _retry_failure(attach_task, exc, attempts)
 
 
 @task(name="detach_task",
@@ -271,42 +267,38 @@ def attach_task(driverCls, provider, identity, instance_id, volume_id,
       default_retry_delay=20,
       ignore_result=False)
 def detach_task(driverCls, provider, identity,
-                instance_id, volume_id, *args, **kwargs):
+                instance_id, volume_id, attempts=None, *args, **kwargs):
+    """
+    Detach the volume, then look at it once per run until it is detached.
+    attempts - None to detach, else the number of times the volume was
+               seen 'detaching'. (See '_check_again')
+    """
     try:
         logger.debug("detach_task started at %s." % datetime.now())
         driver = get_driver(driverCls, provider, identity)
-        instance = driver.get_instance(instance_id)
-        volume = driver.get_volume(volume_id)
 
-        driver.detach_volume(volume)
+        if attempts is None:
+            volume = driver.get_volume(volume_id)
+            driver.detach_volume(volume)
+            attempts = 0
+
         #When the reslt returns the volume will be 'detaching'
         #We will ensure the volume does not return to 'in-use'
-        attempts = 0
-        while True:
-            volume = driver.get_volume(volume_id)
-            if attempts > 6:  # After 6 attempts (~1min)
-                break
-            #The Openstack way
-            if isinstance(driver, OSDriver)\
-                    and 'detaching' not in volume.extra['status']:
-                break
-            #The Eucalyptus way
-            attach_set = volume.extra['attachmentSet']
-            if isinstance(driver, EucaDriver) and attach_set\
-                    and 'detaching' not in attach_set[0].get('status'):
-                break
-            # Exponential backoff..
-            attempts += 1
-            sleep_time = 2**attempts
-            logger.debug("Volume %s is not ready (%s). Sleep for %s"
-                         % (volume.id, volume.extra['status'], sleep_time))
-            time.sleep(sleep_time)
+        volume = driver.get_volume(volume_id)
+        if attempts <= 6 and _is_detaching(driver, volume):
+            # Exponential backoff.. (After 6 attempts (~2min) move on)
+            logger.debug("Volume %s is not ready (%s). Check again in %s"
+                         % (volume.id, volume.extra['status'],
+                            2**(attempts + 1)))
+            _check_again(detach_task, attempts + 1)
 
         if 'in-use' in volume.extra['status']:
             raise Exception("Failed to detach Volume %s to instance %s"
-                            % (volume, instance))
+                            % (volume, instance_id))
 
         logger.debug("detach_task finished at %s." % datetime.now())
+    except Retry:
+        raise
     except DeviceBusyException:
         #We should NOT retry if the device is busy
         raise
@@ -315,4 +307,54 @@ def detach_task(driverCls, provider, identity,
         if 'Volume is not attached' in exc.message:
             return
         logger.exception(exc)
-        detach_task.retry(exc=exc)
+        _retry_failure(detach_task, exc, attempts)
+
+
+def _is_attaching(driver, volume):
+    #Openstack Check
+    if isinstance(driver, OSDriver):
+        return 'attaching' in volume.extra.get('status', '')
+    if isinstance(driver, EucaDriver):
+        attach_set = volume.extra['attachmentSet'][0]
+        return 'attaching' in attach_set.get('status', '')
+    return False
+
+
+def _is_detaching(driver, volume):
+    #The Openstack way
+    if isinstance(driver, OSDriver):
+        return 'detaching' in volume.extra['status']
+    #The Eucalyptus way
+    attach_set = volume.extra['attachmentSet']
+    if isinstance(driver, EucaDriver) and attach_set:
+        return 'detaching' in attach_set[0].get('status')
+    return False
+
+
+def _check_again(volume_task, attempts):
+    """
+    Run 'volume_task' again in 2**attempts seconds, from the step it is on,
+    instead of sleeping in the worker. (Does not count as a failure)
+    """
+    request = volume_task.request
+    kwargs = dict(request.kwargs, attempts=attempts)
+    raise volume_task.retry(args=request.args, kwargs=kwargs,
+                            countdown=2**attempts,
+                            max_retries=request.retries + 1)
+
+
+def _retry_failure(volume_task, exc, attempts=None):
+    """
+    Retry the step that failed, up to 'max_retries' failures.
+    attempts - Where the failed run got to (See '_check_again'),
+               so a failed check does not repeat the attach/detach.
+    """
+    request = volume_task.request
+    failures = request.kwargs.get('failures', 0)
+    if failures >= volume_task.max_retries:
+        raise exc
+    kwargs = dict(request.kwargs, failures=failures + 1)
+    if attempts is not None:
+        kwargs['attempts'] = attempts
+    raise volume_task.retry(args=request.args, kwargs=kwargs, exc=exc,
+                            max_retries=request.retries + 1)
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Instance, InstanceStatus, InstanceStatusHistory
+from core.models.allocation import day_start, record_active_time
+from core.tests import create_test_identity, create_test_instance
+
+from service.allocation import get_time
+
+
+class GetTimeTests(TestCase):
+    """
+    Active time inside the window, from the daily rollup & edge histories.
+    The window starts at noon (UTC), three days ago.
+    """
+
+    def setUp(self):
+        self.identity = create_test_identity('get_time')
+        self.user = self.identity.created_by
+        today = timezone.now().astimezone(timezone.utc).date()
+        self.window_start = day_start(today - timedelta(days=3))\
+            + timedelta(hours=12)
+        #The first whole day in the window
+        self.first_day_start = day_start(today - timedelta(days=2))
+        self.delta = timezone.now() - self.window_start
+
+    def _instance(self):
+        return create_test_instance(
+            self.identity, 'get_time-%s' % Instance.objects.count(),
+            start_date=self.window_start - timedelta(days=1))
+
+    def _history(self, instance, start_date, end_date=None,
+                 status='active'):
+        history = InstanceStatusHistory.objects.create(
+            instance=instance, start_date=start_date, end_date=end_date,
+            status=InstanceStatus.objects.get_or_create(name=status)[0])
+        record_active_time(history)
+        return history
+
+    def _get_time(self):
+        return get_time(self.user, self.identity.id, self.delta)
+
+    def assertTimeEqual(self, first, second):
+        #'now' moves on while the test runs
+        self.assertTrue(abs(first - second) < timedelta(seconds=5),
+                        "%s != %s" % (first, second))
+
+    def test_crossing_window_start(self):
+        self._history(self._instance(),
+                      self.window_start - timedelta(hours=2),
+                      self.window_start + timedelta(hours=1))
+        self.assertTimeEqual(self._get_time(), timedelta(hours=1))
+
+    def test_crossing_first_midnight(self):
+        self._history(self._instance(),
+                      self.window_start + timedelta(hours=10),
+                      self.first_day_start + timedelta(hours=3))
+        self.assertTimeEqual(self._get_time(), timedelta(hours=5))
+
+    def test_crossing_midnight(self):
+        midnight = self.first_day_start + timedelta(days=1)
+        self._history(self._instance(),
+                      midnight - timedelta(hours=2),
+                      midnight + timedelta(hours=3))
+        self.assertTimeEqual(self._get_time(), timedelta(hours=5))
+
+    def test_open_history(self):
+        start_date = self.first_day_start + timedelta(days=1, hours=5)
+        self._history(self._instance(), start_date)
+        self.assertTimeEqual(self._get_time(),
+                             timezone.now() - start_date)
+
+    def test_open_history_before_window(self):
+        self._history(self._instance(),
+                      self.window_start - timedelta(hours=6))
+        self.assertTimeEqual(self._get_time(),
+                             timezone.now() - self.window_start)
+
+    def test_closed_on_partial_first_day(self):
+        self._history(self._instance(),
+                      self.window_start + timedelta(hours=1),
+                      self.window_start + timedelta(hours=3))
+        self.assertTimeEqual(self._get_time(), timedelta(hours=2))
+
+    def test_outside_window(self):
+        self._history(self._instance(),
+                      self.window_start - timedelta(hours=5),
+                      self.window_start - timedelta(hours=1))
+        self.assertTimeEqual(self._get_time(), timedelta(0))
+
+    def test_inactive_history(self):
+        self._history(self._instance(),
+                      self.first_day_start + timedelta(hours=1),
+                      self.first_day_start + timedelta(hours=4),
+                      status='suspended')
+        self.assertTimeEqual(self._get_time(), timedelta(0))
+
+    def test_matches_history_walk(self):
+        """
+        Inside the window, the rollup agrees with '_calculate_active_time'
+        """
+        instances = [self._instance() for _ in range(3)]
+        start = self.window_start + timedelta(hours=1)
+        hour = timedelta(hours=1)
+        #Build, active across two midnights, suspended, active again
+        self._history(instances[0], start, start + hour, status='build')
+        self._history(instances[0], start + hour, start + 40*hour)
+        self._history(instances[0], start + 40*hour, start + 41*hour,
+                      status='suspended')
+        self._history(instances[0], start + 41*hour)
+        #Closed on the partial first day
+        self._history(instances[1], start, start + 2*hour)
+        #Short histories on the same day
+        self._history(instances[2], start + 20*hour, start + 21*hour)
+        self._history(instances[2], start + 22*hour, start + 23*hour,
+                      status='shutoff')
+        self._history(instances[2], start + 23*hour, start + 25*hour)
+        walk_time = sum([instance._calculate_active_time()
+                         for instance in instances], timedelta(0))
+        self.assertTimeEqual(self._get_time(), walk_time)
@@ -0,0 +1,144 @@
+import socket
+
+from django.core.cache import get_cache
+from django.core.cache.backends import locmem
+from django.test import TestCase
+
+from atmosphere import settings
+
+from service import circuit
+from service.exceptions import ProviderUnavailable
+
+
+class _Clock(object):
+    """
+    Stands in for 'time' in the circuit and in the locmem cache,
+    so cache timeouts pass when the test says so.
+    """
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class _Connection(object):
+    """
+    A libcloud connection, each request takes 'latency' seconds
+    or fails with 'error'.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.latency = 1
+        self.error = None
+        self.requests = 0
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+        self.clock.advance(self.latency)
+        if self.error:
+            raise self.error
+        return 'response'
+
+
+class _LibcloudDriver(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+
+class _Driver(object):
+    def __init__(self, connection):
+        self._connection = _LibcloudDriver(connection)
+
+
+class CircuitTests(TestCase):
+    """
+    Failed and slow requests open the circuit of a provider,
+    a single trial request closes it again.
+    """
+
+    def setUp(self):
+        self.clock = _Clock()
+        self._cache = circuit.cache
+        self._circuit_time = circuit.time
+        self._locmem_time = locmem.time
+        circuit.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache',
+            LOCATION='circuit-tests')
+        circuit.cache.clear()
+        circuit.time = self.clock
+        locmem.time = self.clock
+        self.threshold = settings.PROVIDER_FAILURE_THRESHOLD
+        self.budget = settings.PROVIDER_LATENCY_BUDGET.total_seconds()
+        self.reset = settings.PROVIDER_CIRCUIT_RESET.total_seconds()
+        self.connection = _Connection(self.clock)
+        circuit.guard_driver(_Driver(self.connection), 'provider-1')
+
+    def tearDown(self):
+        circuit.cache = self._cache
+        circuit.time = self._circuit_time
+        locmem.time = self._locmem_time
+
+    def _request(self):
+        return self.connection.request('/servers/detail')
+
+    def _fail(self, times):
+        self.connection.error = socket.error("Connection refused")
+        for _ in range(times):
+            self.assertRaises(socket.error, self._request)
+        self.connection.error = None
+
+    def test_closed(self):
+        self.assertEqual(self._request(), 'response')
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.CLOSED)
+
+    def test_guarded_once(self):
+        circuit.guard_driver(_Driver(self.connection), 'provider-1')
+        self._fail(self.threshold - 1)
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.CLOSED)
+        self.assertEqual(self.connection.timeout, self.budget)
+
+    def test_opens_after_threshold(self):
+        self._fail(self.threshold)
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.OPEN)
+        requests = self.connection.requests
+        self.assertRaises(ProviderUnavailable, self._request)
+        #Fails fast, the provider is not asked
+        self.assertEqual(self.connection.requests, requests)
+        #Other providers are not affected
+        self.assertEqual(circuit.circuit_state('provider-2'), circuit.CLOSED)
+
+    def test_success_resets_failures(self):
+        self._fail(self.threshold - 1)
+        self._request()
+        self._fail(self.threshold - 1)
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.CLOSED)
+
+    def test_slow_requests_count(self):
+        self.connection.latency = self.budget + 1
+        for _ in range(self.threshold):
+            self.assertEqual(self._request(), 'response')
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.OPEN)
+
+    def test_half_open_single_trial(self):
+        self._fail(self.threshold)
+        self.clock.advance(self.reset + 1)
+        self.assertEqual(circuit.circuit_state('provider-1'),
+                         circuit.HALF_OPEN)
+        #One request is let through, the others fail fast meanwhile
+        circuit.allow_request('provider-1')
+        self.assertRaises(ProviderUnavailable,
+                          circuit.allow_request, 'provider-1')
+        circuit.record_success('provider-1')
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.CLOSED)
+        self.assertEqual(self._request(), 'response')
+
+    def test_half_open_failure_reopens(self):
+        self._fail(self.threshold)
+        self.clock.advance(self.reset + 1)
+        self._fail(1)
+        self.assertEqual(circuit.circuit_state('provider-1'), circuit.OPEN)
+        self.assertRaises(ProviderUnavailable, self._request)
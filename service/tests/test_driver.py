@@ -0,0 +1,122 @@
+import threading
+
+from django.test import TestCase
+
+from service import driver as service_driver
+from service.driver import DriverPool
+
+
+class _Clock(object):
+    """
+    Stands in for 'time' in service.driver.
+    """
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class _Driver(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class DriverPoolTests(TestCase):
+    """
+    Pooled drivers are evicted least recently used first, expire after
+    'ttl' and are dropped when their generation is invalidated.
+    """
+
+    def setUp(self):
+        self._time = service_driver.time
+        self.clock = service_driver.time = _Clock()
+        self.pool = DriverPool(max_size=2, ttl=60)
+
+    def tearDown(self):
+        service_driver.time = self._time
+
+    def _put(self, identity_id, name=None):
+        return self.pool.put(identity_id, 'user', 'creds', True,
+                             _Driver(name or 'driver-%s' % identity_id))
+
+    def _get(self, identity_id):
+        return self.pool.get(identity_id, 'user', 'creds', True)
+
+    def test_get_returns_a_copy(self):
+        self._put(1)
+        pooled = self._get(1)
+        self.assertEqual(pooled.name, 'driver-1')
+        pooled.name = 'changed'
+        self.assertEqual(self._get(1).name, 'driver-1')
+
+    def test_key_includes_credentials_and_guard(self):
+        self._put(1)
+        self.assertEqual(self.pool.get(1, 'user', 'new-creds', True), None)
+        self.assertEqual(self.pool.get(1, 'user', 'creds', False), None)
+        self.assertEqual(self.pool.get(1, 'other', 'creds', True), None)
+
+    def test_least_recently_used_is_evicted(self):
+        self._put(1)
+        self._put(2)
+        #Using 1 makes 2 the least recently used.
+        self.assertNotEqual(self._get(1), None)
+        self._put(3)
+        self.assertNotEqual(self._get(1), None)
+        self.assertEqual(self._get(2), None)
+        self.assertNotEqual(self._get(3), None)
+
+    def test_expired_driver_is_dropped(self):
+        self._put(1)
+        self.clock.advance(60)
+        self.assertNotEqual(self._get(1), None)
+        self.clock.advance(1)
+        self.assertEqual(self._get(1), None)
+        #Dropped, not just hidden.
+        self.clock.now -= 61
+        self.assertEqual(self._get(1), None)
+
+    def test_put_restarts_ttl(self):
+        self._put(1)
+        self.clock.advance(50)
+        self._put(1, 'driver-renewed')
+        self.clock.advance(50)
+        self.assertEqual(self._get(1).name, 'driver-renewed')
+
+    def test_invalidate_identity(self):
+        self._put(1)
+        self._put(2)
+        self.pool.invalidate(1)
+        self.assertEqual(self._get(1), None)
+        self.assertNotEqual(self._get(2), None)
+        #New drivers for the identity are pooled again.
+        self._put(1)
+        self.assertNotEqual(self._get(1), None)
+
+    def test_invalidate_all(self):
+        self._put(1)
+        self._put(2)
+        self.pool.invalidate()
+        self.assertEqual(self._get(1), None)
+        self.assertEqual(self._get(2), None)
+
+    def test_invalidate_reaches_other_threads(self):
+        found = []
+
+        def pool_driver():
+            self._put(1)
+            found.append(self._get(1))
+            self.pool.invalidate(1)
+            found.append(self._get(1))
+
+        #Each thread has its own pool.
+        self._put(1)
+        thread = threading.Thread(target=pool_driver)
+        thread.start()
+        thread.join()
+        self.assertNotEqual(found[0], None)
+        self.assertEqual(found[1], None)
+        self.assertEqual(self._get(1), None)
@@ -0,0 +1,90 @@
+from django.test import TestCase
+
+from service import job as job_module
+
+
+class _AsyncResult(object):
+    """
+    Stands in for celery's AsyncResult, looked up in 'states' by task id
+    """
+    states = {}
+
+    def __init__(self, task_id):
+        self.state, self.result = self.states.get(task_id, ('PENDING', None))
+
+
+class JobStatusTests(TestCase):
+    """
+    The state of a job follows the state of the steps in its chain.
+    """
+
+    def setUp(self):
+        self._async_result = job_module.AsyncResult
+        job_module.AsyncResult = _AsyncResult
+        _AsyncResult.states = {}
+        self.job = {
+            'id': 'job-1',
+            'username': 'jobs',
+            'action': 'attach_volume',
+            'params': {'volume_id': 'vol-1'},
+            'steps': [('attach', 'task-1'), ('check', 'task-2'),
+                      ('mount', 'task-3')],
+        }
+
+    def tearDown(self):
+        job_module.AsyncResult = self._async_result
+
+    def _status(self, **states):
+        _AsyncResult.states = states
+        return job_module.job_status(self.job)
+
+    def test_pending(self):
+        status = self._status()
+        self.assertEqual(status['state'], job_module.PENDING)
+        self.assertEqual([step['state'] for step in status['steps']],
+                         ['pending', 'pending', 'pending'])
+        self.assertEqual(status['result'], None)
+        self.assertEqual(status['error'], None)
+
+    def test_running_once_a_step_starts(self):
+        status = self._status(**{'task-1': ('STARTED', None)})
+        self.assertEqual(status['state'], job_module.RUNNING)
+        self.assertEqual(status['steps'][0],
+                         {'name': 'attach', 'state': 'started'})
+
+    def test_running_until_every_step_succeeds(self):
+        status = self._status(**{'task-1': ('SUCCESS', '/dev/vdb'),
+                                 'task-2': ('SUCCESS', None)})
+        self.assertEqual(status['state'], job_module.RUNNING)
+        #Partial results are not shown until the job is done
+        self.assertEqual(status['result'], None)
+
+    def test_success(self):
+        status = self._status(**{'task-1': ('SUCCESS', '/dev/vdb'),
+                                 'task-2': ('SUCCESS', None),
+                                 'task-3': ('SUCCESS', '/vol1')})
+        self.assertEqual(status['state'], job_module.SUCCESS)
+        self.assertEqual(status['result'], {'attach': '/dev/vdb',
+                                            'check': None,
+                                            'mount': '/vol1'})
+        self.assertEqual(status['error'], None)
+        self.assertEqual(status['id'], 'job-1')
+        self.assertEqual(status['action'], 'attach_volume')
+        self.assertEqual(status['params'], {'volume_id': 'vol-1'})
+
+    def test_failure(self):
+        status = self._status(**{
+            'task-1': ('SUCCESS', '/dev/vdb'),
+            'task-2': ('FAILURE', Exception("Volume is busy"))})
+        self.assertEqual(status['state'], job_module.FAILURE)
+        self.assertEqual(status['error'], "Volume is busy")
+        self.assertEqual(status['result'], None)
+        self.assertEqual([step['state'] for step in status['steps']],
+                         ['success', 'failure', 'pending'])
+
+    def test_first_failure_is_reported(self):
+        status = self._status(**{
+            'task-1': ('FAILURE', Exception("Attach failed")),
+            'task-2': ('FAILURE', Exception("Check failed"))})
+        self.assertEqual(status['state'], job_module.FAILURE)
+        self.assertEqual(status['error'], "Attach failed")
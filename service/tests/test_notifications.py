@@ -0,0 +1,91 @@
+import json
+
+from django.test import TestCase
+
+from core.models import Instance, Size
+from core.models.instance import clear_cached_statuses
+from core.tests import create_test_identity, create_test_instance
+
+from service import notifications
+
+
+class InstanceNotificationTests(TestCase):
+    """
+    Compute notifications are recorded like the monitor would record them.
+    """
+
+    def setUp(self):
+        #Statuses cached by an earlier test were rolled back with it
+        clear_cached_statuses()
+        self._poke_watches = notifications.poke_watches
+        self.poked = []
+        notifications.poke_watches = self.poked.append
+        identity = create_test_identity('notified')
+        self.provider = identity.provider
+        self.tiny = Size.objects.create(alias='1', name='tiny',
+                                        provider=self.provider,
+                                        cpu=1, disk=1, root=1, mem=512)
+        self.large = Size.objects.create(alias='2', name='large',
+                                         provider=self.provider,
+                                         cpu=4, disk=1, root=1, mem=8192)
+        self.instance = create_test_instance(identity, 'notified')
+        self.instance.update_history('active', self.tiny, first_update=True)
+
+    def tearDown(self):
+        notifications.poke_watches = self._poke_watches
+        clear_cached_statuses()
+
+    def _publish(self, event_type, **payload):
+        """
+        The body 'publish_notification' sends, through the consumer's parser
+        """
+        payload.setdefault('instance_id', 'i-notified')
+        body = json.dumps({'event_type': event_type, 'payload': payload})
+        event_type, payload = notifications._parse_notification(body)
+        return notifications.apply_instance_notification(
+            self.provider, event_type, payload)
+
+    def _last_history(self):
+        return Instance.objects.get(id=self.instance.id).last_history()
+
+    def test_update(self):
+        core_instance = self._publish('compute.instance.update',
+                                      state='suspended',
+                                      instance_flavor_id='2')
+        self.assertEqual(core_instance.id, self.instance.id)
+        last_history = self._last_history()
+        self.assertEqual(last_history.status.name, 'suspended')
+        self.assertEqual(last_history.size, self.large)
+        self.assertEqual(self.poked, ['i-notified'])
+
+    def test_update_keeps_size(self):
+        self._publish('compute.instance.update', state='stopped')
+        last_history = self._last_history()
+        self.assertEqual(last_history.status.name, 'shutoff')
+        self.assertEqual(last_history.size, self.tiny)
+
+    def test_update_with_task(self):
+        self._publish('compute.instance.update', state='active',
+                      new_task_state='powering-off')
+        self.assertEqual(self._last_history().status.name, 'suspended')
+
+    def test_delete(self):
+        self._publish('compute.instance.delete.end', state='deleted')
+        self.assertTrue(all(history.end_date for history in
+                            self.instance.instancestatushistory_set.all()))
+
+    def test_unknown_instance(self):
+        self.assertEqual(self._publish('compute.instance.update',
+                                       instance_id='i-unknown',
+                                       state='active'), None)
+        self.assertEqual(self._publish('compute.volume.update',
+                                       state='active'), None)
+        self.assertEqual(self.poked, [])
+
+    def test_oslo_envelope(self):
+        body = {'oslo.version': '2.0', 'oslo.message': json.dumps(
+            {'event_type': 'compute.instance.update',
+             'payload': {'instance_id': 'i-notified'}})}
+        self.assertEqual(notifications._parse_notification(body),
+                         ('compute.instance.update',
+                          {'instance_id': 'i-notified'}))
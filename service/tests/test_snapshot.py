@@ -0,0 +1,202 @@
+from django.core.cache import get_cache
+from django.test import TestCase
+
+import api
+from core.models import Group, Identity, IdentityMembership, Quota
+from core.models import instance as instance_module
+from core.tests import create_test_identity, create_test_instance
+
+from service import instance as service_instance
+from service.instance import instance_fingerprint, diff_instance_snapshot,\
+    save_instance_fingerprints
+from service.tasks import allocation
+
+
+class _Size(object):
+    def __init__(self, alias):
+        self.id = alias
+
+
+class _EshInstance(object):
+    def __init__(self, alias, status_name='active', size='1', task=None,
+                 ip='10.0.0.1', metadata=None):
+        self.id = alias
+        self.size = _Size(size)
+        self.ip = ip
+        self.extra = {'status': status_name, 'task': task,
+                      'metadata': metadata or {}}
+
+
+class _SnapshotTestCase(TestCase):
+
+    def setUp(self):
+        self._cache = service_instance.cache
+        service_instance.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache',
+            LOCATION='snapshot-tests')
+        service_instance.cache.clear()
+
+    def tearDown(self):
+        service_instance.cache = self._cache
+
+
+class InstanceSnapshotTests(_SnapshotTestCase):
+    """
+    Each pass is compared to the fingerprints saved by the last one.
+    """
+
+    def _diff(self, esh_instances, identity_id=1):
+        added, changed, removed, fingerprints = diff_instance_snapshot(
+            identity_id, esh_instances)
+        return ([esh_instance.id for esh_instance in added],
+                [esh_instance.id for esh_instance in changed],
+                removed, fingerprints)
+
+    def _save(self, esh_instances, identity_id=1):
+        fingerprints = self._diff(esh_instances, identity_id)[3]
+        save_instance_fingerprints(identity_id, fingerprints)
+
+    def test_first_pass(self):
+        added, changed, removed, fingerprints = self._diff(
+            [_EshInstance('i-1'), _EshInstance('i-2')])
+        self.assertEqual(added, ['i-1', 'i-2'])
+        self.assertEqual(changed, [])
+        #No saved listing, nothing is known to be removed
+        self.assertEqual(removed, None)
+        self.assertEqual(sorted(fingerprints.keys()), ['i-1', 'i-2'])
+
+    def test_unchanged(self):
+        self._save([_EshInstance('i-1'), _EshInstance('i-2')])
+        self.assertEqual(
+            self._diff([_EshInstance('i-1'), _EshInstance('i-2')])[:3],
+            ([], [], []))
+
+    def test_added_changed_removed(self):
+        self._save([_EshInstance('i-1'), _EshInstance('i-2'),
+                    _EshInstance('i-3')])
+        added, changed, removed, fingerprints = self._diff(
+            [_EshInstance('i-1', status_name='suspended'),
+             _EshInstance('i-3'), _EshInstance('i-4')])
+        self.assertEqual(added, ['i-4'])
+        self.assertEqual(changed, ['i-1'])
+        self.assertEqual(removed, ['i-2'])
+        self.assertEqual(sorted(fingerprints.keys()), ['i-1', 'i-3', 'i-4'])
+
+    def test_unsaved_pass_is_compared_again(self):
+        self._save([_EshInstance('i-1')])
+        self._diff([_EshInstance('i-1', status_name='suspended')])
+        #Fingerprints are only kept once they are saved
+        self.assertEqual(
+            self._diff([_EshInstance('i-1', status_name='suspended')])[1],
+            ['i-1'])
+
+    def test_snapshots_are_per_identity(self):
+        self._save([_EshInstance('i-1')], identity_id=1)
+        self.assertEqual(self._diff([_EshInstance('i-1')],
+                                    identity_id=2)[2], None)
+
+    def test_fingerprint(self):
+        fingerprint = instance_fingerprint(_EshInstance('i-1'))
+        for esh_instance in [_EshInstance('i-1', status_name='suspended'),
+                             _EshInstance('i-1', task='powering-off'),
+                             _EshInstance('i-1', size='2'),
+                             _EshInstance('i-1', ip='10.0.0.2'),
+                             _EshInstance('i-1', metadata={'name': 'a'})]:
+            self.assertNotEqual(instance_fingerprint(esh_instance),
+                                fingerprint)
+        self.assertEqual(
+            instance_fingerprint(_EshInstance('i-1', metadata={'a': '1',
+                                                               'b': '2'})),
+            instance_fingerprint(_EshInstance('i-1', metadata={'b': '2',
+                                                               'a': '1'})))
+
+
+class MonitorSnapshotTests(_SnapshotTestCase):
+    """
+    The monitor converts what changed and end-dates what is gone,
+    without end-dating instances that are still listed.
+    """
+
+    def setUp(self):
+        super(MonitorSnapshotTests, self).setUp()
+        self.identity = create_test_identity('monitored')
+        self.provider = self.identity.provider
+        IdentityMembership.objects.create(
+            identity=self.identity, quota=Quota.objects.create(),
+            member=Group.objects.get(name='monitored'))
+        for name in ['live', 'other', 'gone']:
+            create_test_instance(self.identity, name)
+        self.converted = []
+        self.ended = []
+        self.size_resolvers = []
+        self._get_esh_driver = api.get_esh_driver
+        self._convert_esh_instances = instance_module.convert_esh_instances
+        self._update_instances = allocation.update_instances
+        api.get_esh_driver = lambda identity, guarded=True: object()
+        instance_module.convert_esh_instances = self._convert
+        allocation.update_instances = self._update
+
+    def tearDown(self):
+        api.get_esh_driver = self._get_esh_driver
+        instance_module.convert_esh_instances = self._convert_esh_instances
+        allocation.update_instances = self._update_instances
+        super(MonitorSnapshotTests, self).tearDown()
+
+    def _convert(self, driver, esh_instances, *args, **kwargs):
+        self.converted.append(sorted(esh_instance.id
+                                     for esh_instance in esh_instances))
+        self.size_resolvers.append(kwargs['size_resolver'])
+
+    def _update(self, driver, identity, esh_list, core_list, *args):
+        self.assertEqual(esh_list, [])
+        self.ended.append(sorted(core_instance.provider_alias
+                                 for core_instance in core_list))
+
+    def _monitor(self, esh_instances):
+        self.converted, self.ended = [], []
+        allocation.monitor_instances_for_user(self.provider, 'monitored',
+                                              esh_instances)
+
+    def test_first_pass_ends_unlisted_instances(self):
+        self._monitor([_EshInstance('i-live'), _EshInstance('i-other')])
+        self.assertEqual(self.converted, [['i-live', 'i-other']])
+        self.assertEqual(self.ended, [['i-gone']])
+
+    def test_unchanged_pass(self):
+        listing = [_EshInstance('i-live'), _EshInstance('i-other')]
+        self._monitor(listing)
+        self._monitor(listing)
+        self.assertEqual(self.converted, [])
+        self.assertEqual(self.ended, [[]])
+
+    def test_changed_and_removed(self):
+        self._monitor([_EshInstance('i-live'), _EshInstance('i-other')])
+        self._monitor([_EshInstance('i-live', status_name='suspended')])
+        self.assertEqual(self.converted, [['i-live']])
+        self.assertEqual(self.ended, [['i-other']])
+
+    def test_batch_shares_size_resolver(self):
+        user, group = Group.create_usergroup('monitored_too')
+        identity = Identity.objects.create(created_by=user,
+                                           provider=self.provider)
+        IdentityMembership.objects.create(
+            identity=identity, quota=Quota.objects.create(), member=group)
+        create_test_instance(identity, 'too')
+        patched = dict(
+            (name, getattr(allocation, name))
+            for name in ['_load_instances', 'check_fleet_allocation',
+                         'get_fleet_allocation_dicts', 'set_allocation_dicts'])
+        allocation._load_instances = lambda driver, dumped: dumped
+        allocation.check_fleet_allocation = lambda *args, **kwargs: {}
+        allocation.get_fleet_allocation_dicts = lambda *args, **kwargs: {}
+        allocation.set_allocation_dicts = lambda allocation_dicts: None
+        try:
+            result = allocation.monitor_tenant_batch(self.provider.id, {
+                'monitored': [_EshInstance('i-live')],
+                'monitored_too': [_EshInstance('i-too')]})
+        finally:
+            for name, value in patched.items():
+                setattr(allocation, name, value)
+        self.assertEqual(result['monitored'], 2)
+        self.assertEqual(len(self.size_resolvers), 2)
+        self.assertTrue(self.size_resolvers[0] is self.size_resolvers[1])
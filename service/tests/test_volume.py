@@ -0,0 +1,138 @@
+from celery.exceptions import Retry
+
+from django.test import TestCase
+
+from rtwo.driver import OSDriver
+
+from service.tasks import volume as volume_tasks
+
+
+class _Volume(object):
+    def __init__(self, volume_id, status):
+        self.id = volume_id
+        self.extra = {'status': status,
+                      'attachmentSet': [{'device': '/dev/vdb'}]}
+
+
+class _Driver(OSDriver):
+    """
+    An OpenStack driver whose volume goes through 'statuses',
+    one per get_volume. 'errors' maps the n-th call (From 1) to the
+    exception it raises.
+    """
+    def __init__(self, statuses, errors=None):
+        self.statuses = list(statuses)
+        self.errors = errors or {}
+        self.calls = []
+
+    def _step(self, name):
+        self.calls.append(name)
+        if len(self.calls) in self.errors:
+            raise self.errors[len(self.calls)]
+
+    def get_instance(self, instance_id):
+        self._step('get_instance')
+        return instance_id
+
+    def get_volume(self, volume_id):
+        self._step('get_volume')
+        return _Volume(volume_id, self.statuses.pop(0))
+
+    def attach_volume(self, instance, volume, device_choice):
+        self._step('attach_volume')
+
+    def detach_volume(self, volume):
+        self._step('detach_volume')
+
+
+class VolumeTaskRetryTests(TestCase):
+    """
+    Volume tasks check on the volume again later, from the step they are on,
+    and retry a failure once.
+    (Eagerly, see atmosphere.test_runner)
+    """
+
+    def setUp(self):
+        self._get_driver = volume_tasks.get_driver
+        self.driver = None
+        volume_tasks.get_driver = lambda *args: self.driver
+        self.countdowns = []
+        self._tasks = (volume_tasks.attach_task, volume_tasks.detach_task)
+        for volume_task in self._tasks:
+            volume_task.retry = self._recorder(volume_task.retry)
+
+    def tearDown(self):
+        volume_tasks.get_driver = self._get_driver
+        for volume_task in self._tasks:
+            del volume_task.retry
+
+    def _recorder(self, retry):
+        def record_retry(*args, **kwargs):
+            self.countdowns.append(kwargs.get('countdown'))
+            return retry(*args, **kwargs)
+        return record_retry
+
+    def _run(self, volume_task):
+        """
+        Eager retries run inside the run that asked for them,
+        which then raises 'Retry'.
+        """
+        try:
+            return volume_task.delay(
+                None, None, None, 'instance-1', 'volume-1').get()
+        except Retry:
+            return None
+
+    def _attach(self):
+        return self._run(volume_tasks.attach_task)
+
+    def _detach(self):
+        return self._run(volume_tasks.detach_task)
+
+    def test_attach_checks_again_without_attaching_again(self):
+        self.driver = _Driver(['available', 'attaching', 'attaching',
+                               'in-use'])
+        self._attach()
+        self.assertEqual(self.driver.calls.count('attach_volume'), 1)
+        self.assertEqual(self.driver.calls.count('get_volume'), 4)
+        self.assertEqual(self.countdowns, [2, 4])
+
+    def test_attach_stops_checking(self):
+        self.driver = _Driver(['available'] + ['attaching'] * 8)
+        self._attach()
+        self.assertEqual(self.driver.calls.count('attach_volume'), 1)
+        #Checked 7 times, then moved on.
+        self.assertEqual(self.countdowns, [2, 4, 8, 16, 32, 64, 128])
+
+    def test_attach_failure_retries_the_attach(self):
+        self.driver = _Driver(['available', 'available', 'in-use'],
+                              {3: Exception('No capacity')})
+        self._attach()
+        self.assertEqual(self.driver.calls, [
+            'get_instance', 'get_volume', 'attach_volume',
+            'get_instance', 'get_volume', 'attach_volume', 'get_volume'])
+        self.assertEqual(self.countdowns, [None])
+
+    def test_check_failure_does_not_attach_again(self):
+        #The check after the attach fails, not the attach.
+        self.driver = _Driver(['available', 'attaching', 'in-use'],
+                              {4: Exception('Timed out')})
+        self._attach()
+        self.assertEqual(self.driver.calls, [
+            'get_instance', 'get_volume', 'attach_volume', 'get_volume',
+            'get_volume', 'get_volume'])
+        self.assertEqual(self.countdowns, [None, 2])
+
+    def test_failure_is_retried_once(self):
+        self.driver = _Driver(['available'] * 3,
+                              {3: Exception('No capacity')})
+        self.assertRaises(Exception, self._attach)
+        #Attached again, but the volume never left 'available'
+        self.assertEqual(self.driver.calls.count('attach_volume'), 2)
+        self.assertEqual(self.countdowns, [None])
+
+    def test_detach_checks_again_without_detaching_again(self):
+        self.driver = _Driver(['in-use', 'detaching', 'available'])
+        self._detach()
+        self.assertEqual(self.driver.calls.count('detach_volume'), 1)
+        self.assertEqual(self.countdowns, [2])
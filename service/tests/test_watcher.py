@@ -0,0 +1,164 @@
+from django.utils import unittest
+
+from service import watcher
+
+
+class _Redis(object):
+    """
+    The hash commands 'service.watcher' uses.
+    """
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key, field):
+        return 1 if self.hashes.get(key, {}).pop(field, None) else 0
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+class _Node(object):
+    def __init__(self, status, task=None):
+        self.extra = {'status': status, 'task': task}
+
+
+class _EshInstance(object):
+    def __init__(self, alias, status, task=None):
+        self.id = alias
+        self._node = _Node(status, task)
+
+
+class _Driver(object):
+    pass
+
+
+class _Provider(object):
+    identifier = 'watch-test'
+
+
+class _Identity(object):
+    credentials = {'key': 'watch-test'}
+
+
+class _Signature(object):
+    """
+    Records every apply_async, in place of a celery subtask.
+    """
+    applied = []
+
+    def __init__(self, name):
+        self.name = name
+
+    def apply_async(self, args=()):
+        _Signature.applied.append((self.name, args))
+
+
+class WatchResultTests(unittest.TestCase):
+    """
+    A watch resolves to what 'wait_for' would have returned.
+    """
+
+    def _watch(self, **kwargs):
+        watch = {'instance_alias': 'i-1', 'status_query': ['active'],
+                 'tasks_allowed': False, 'return_id': False}
+        watch.update(kwargs)
+        return watch
+
+    def test_ready_instance(self):
+        instance_map = {'i-1': _EshInstance('i-1', 'ACTIVE')}
+        self.assertEqual(watcher._watch_result(self._watch(), instance_map),
+                         (True,))
+        self.assertEqual(
+            watcher._watch_result(self._watch(return_id=True), instance_map),
+            ('i-1',))
+
+    def test_instance_not_ready(self):
+        instance_map = {'i-1': _EshInstance('i-1', 'build')}
+        self.assertEqual(watcher._watch_result(self._watch(), instance_map),
+                         None)
+
+    def test_instance_with_task(self):
+        instance_map = {'i-1': _EshInstance('i-1', 'active', 'networking')}
+        self.assertEqual(watcher._watch_result(self._watch(), instance_map),
+                         None)
+        self.assertEqual(
+            watcher._watch_result(self._watch(tasks_allowed=True),
+                                  instance_map),
+            (True,))
+
+    def test_terminated_instance(self):
+        self.assertEqual(watcher._watch_result(self._watch(), {}), (False,))
+        self.assertEqual(
+            watcher._watch_result(self._watch(return_id=True), {}), (None,))
+
+
+class WatchOnceTests(unittest.TestCase):
+    """
+    Only the tick that removes a watch resumes (or expires) its chain.
+    """
+
+    def setUp(self):
+        self._client, self._subtask = watcher._client, watcher.subtask
+        self._list_instances = watcher._list_instances
+        watcher._client = _Redis()
+        watcher.subtask = lambda signature: signature
+        _Signature.applied = []
+
+    def tearDown(self):
+        watcher._client, watcher.subtask = self._client, self._subtask
+        watcher._list_instances = self._list_instances
+
+    def _watch_instance(self, timeout=60*60):
+        watcher.watch_instance(
+            'watch-1', 'i-1', _Driver, _Provider(), _Identity(), ['active'],
+            callbacks=[_Signature('callback')],
+            errbacks=[_Signature('errback')], timeout=timeout)
+
+    def _load(self):
+        return watcher._load_watches()['watch-1']
+
+    def test_resume_once(self):
+        self._watch_instance()
+        watch = self._load()
+        watcher._resume('watch-1', watch, True)
+        watcher._resume('watch-1', watch, True)
+        self.assertEqual(_Signature.applied, [('callback', (True,))])
+        self.assertFalse(watcher.is_watched('i-1'))
+
+    def test_expire_once(self):
+        self._watch_instance()
+        watch = self._load()
+        watcher._expire('watch-1', watch)
+        watcher._expire('watch-1', watch)
+        self.assertEqual(_Signature.applied, [('errback', ('watch-1',))])
+
+    def test_no_resume_after_expire(self):
+        self._watch_instance()
+        watch = self._load()
+        watcher._expire('watch-1', watch)
+        watcher._resume('watch-1', watch, True)
+        self.assertEqual(_Signature.applied, [('errback', ('watch-1',))])
+
+    def test_run_watches(self):
+        self._watch_instance()
+        watcher._list_instances = lambda watch: {
+            'i-1': _EshInstance('i-1', 'build')}
+        watcher.run_watches()
+        self.assertEqual(_Signature.applied, [])
+        self.assertTrue(watcher.is_watched('i-1'))
+        watcher._list_instances = lambda watch: {
+            'i-1': _EshInstance('i-1', 'active')}
+        watcher.run_watches()
+        watcher.run_watches()
+        self.assertEqual(_Signature.applied, [('callback', (True,))])
+
+    def test_run_watches_expires(self):
+        self._watch_instance(timeout=-1)
+        #Listing failed, the deadline still applies
+        watcher._list_instances = lambda watch: None
+        watcher.run_watches()
+        self.assertEqual(_Signature.applied, [('errback', ('watch-1',))])
+        self.assertFalse(watcher.is_watched('i-1'))
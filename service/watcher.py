@@ -0,0 +1,161 @@
+"""
+One watcher for every instance a task is waiting on.
+
+'wait_for' registers a watch (instance, desired states, the rest of its
+chain) instead of polling the provider by itself. Every tick,
+'run_watches' lists the instances of each watched tenant once and
+resumes the chains of the instances that are ready.
+"""
+import cPickle as pickle
+import time
+from hashlib import md5
+
+import redis
+from celery import subtask
+
+from threepio import logger
+
+from service.driver import get_driver
+
+WATCH_KEY = "instance_watches"
+
+
+def watch_instance(watch_id, instance_alias, driverCls, provider, identity,
+                   status_query, tasks_allowed=False, return_id=False,
+                   callbacks=None, errbacks=None, timeout=None):
+    """
+    Resume 'callbacks' with the result of 'wait_for' once 'instance_alias'
+    reaches 'status_query'. 'errbacks' are called with 'watch_id' if it
+    has not after 'timeout' seconds.
+    """
+    from atmosphere import settings
+    if timeout is None:
+        timeout = settings.INSTANCE_WATCH_TIMEOUT.total_seconds()
+    watch = {
+        'instance_alias': instance_alias,
+        'driverCls': driverCls,
+        'provider': provider,
+        'identity': identity,
+        'status_query': status_query,
+        'tasks_allowed': tasks_allowed,
+        'return_id': return_id,
+        'callbacks': callbacks or [],
+        'errbacks': errbacks or [],
+        'deadline': time.time() + timeout,
+    }
+    _watch_client().hset(WATCH_KEY, watch_id,
+                         pickle.dumps(watch, pickle.HIGHEST_PROTOCOL))
+    return watch_id
+
+
+def is_watched(instance_alias):
+    return any(watch['instance_alias'] == instance_alias
+               for watch in _load_watches().values())
+
+
+def run_watches(instance_alias=None):
+    """
+    Look at every watched instance (Or just 'instance_alias'),
+    one listing per tenant.
+    """
+    tenant_watches = {}
+    for watch_id, watch in _load_watches().items():
+        if instance_alias and watch['instance_alias'] != instance_alias:
+            continue
+        tenant_watches.setdefault(_tenant_key(watch), []).append(
+            (watch_id, watch))
+    now = time.time()
+    for watches in tenant_watches.values():
+        instance_map = _list_instances(watches[0][1])
+        for watch_id, watch in watches:
+            if instance_map is not None:
+                result = _watch_result(watch, instance_map)
+                if result is not None:
+                    _resume(watch_id, watch, result[0])
+                    continue
+            if watch['deadline'] < now:
+                _expire(watch_id, watch)
+
+
+def is_instance_ready(esh_instance, status_query, tasks_allowed=False):
+    i_status = esh_instance._node.extra['status'].lower()
+    i_task = esh_instance._node.extra['task']
+    return (i_status in status_query) and (tasks_allowed or not i_task)
+
+
+def _watch_result(watch, instance_map):
+    """
+    Returns (result,) once 'wait_for' would have returned, otherwise None
+    """
+    esh_instance = instance_map.get(watch['instance_alias'])
+    if not esh_instance:
+        logger.debug("Instance has been teminated: %s."
+                     % watch['instance_alias'])
+        return (None,) if watch['return_id'] else (False,)
+    if not is_instance_ready(esh_instance, watch['status_query'],
+                             watch['tasks_allowed']):
+        return None
+    return (esh_instance.id,) if watch['return_id'] else (True,)
+
+
+def _list_instances(watch):
+    try:
+        driver = get_driver(watch['driverCls'], watch['provider'],
+                            watch['identity'])
+        return dict((esh_instance.id, esh_instance)
+                    for esh_instance in driver.list_instances())
+    except Exception:
+        logger.exception("Unable to list instances for watch on %s"
+                         % watch['instance_alias'])
+        return None
+
+
+def _resume(watch_id, watch, result):
+    #Only the tick that removes the watch resumes the chain
+    if not _watch_client().hdel(WATCH_KEY, watch_id):
+        return
+    for callback in watch['callbacks']:
+        subtask(callback).apply_async((result,))
+
+
+def _expire(watch_id, watch):
+    if not _watch_client().hdel(WATCH_KEY, watch_id):
+        return
+    logger.warn("Gave up waiting on instance %s for %s"
+                % (watch['instance_alias'], watch['status_query']))
+    for errback in watch['errbacks']:
+        subtask(errback).apply_async((watch_id,))
+
+
+def _load_watches():
+    client = _watch_client()
+    watches = {}
+    for watch_id, data in client.hgetall(WATCH_KEY).items():
+        try:
+            watches[watch_id] = pickle.loads(data)
+        except Exception:
+            logger.exception("Dropping unreadable watch %s" % watch_id)
+            client.hdel(WATCH_KEY, watch_id)
+    return watches
+
+
+def _tenant_key(watch):
+    """
+    Watches with the same driver, provider and credentials share a listing
+    """
+    provider = watch['provider']
+    credentials = getattr(watch['identity'], 'credentials', None) or {}
+    return md5(repr((watch['driverCls'].__name__,
+                     getattr(provider, 'identifier', None)
+                     or provider.__class__.__name__,
+                     sorted(credentials.items())))).hexdigest()
+
+
+def _watch_client():
+    global _client
+    if _client is None:
+        from atmosphere import settings
+        _client = redis.StrictRedis.from_url(settings.INSTANCE_WATCH_URL)
+    return _client
+
+_client = None